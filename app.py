@@ -5,9 +5,11 @@ import os
 from pathlib import Path
 import json
 from cover_drive_analysis_realtime import CoverDriveAnalyzer
-import cv2
+from utils.lazy_import import lazy_import
 import subprocess
 
+cv2 = lazy_import('cv2')
+
 st.set_page_config(
     page_title="AthleteRise - Cricket Analytics",
     page_icon="🏏",
@@ -85,18 +87,16 @@ def analyze_from_url(url):
         try:
             analyzer = CoverDriveAnalyzer()
             
-            # Download and analyze
-            status_text.text("📥 Downloading video...")
+            # Stream and analyze (pose analysis starts while the video downloads)
+            status_text.text("📥 Streaming and processing video...")
             progress_bar.progress(25)
             
-            video_path = analyzer.download_video(url)
+            try:
+                results = analyzer.analyze_url(url)
+            except ValueError:
+                results = None
             
-            if video_path:
-                status_text.text("⚡ Processing video...")
-                progress_bar.progress(50)
-                
-                results = analyzer.analyze_video(video_path)
-                
+            if results:
                 progress_bar.progress(75)
                 status_text.text("🎯 Generating results...")
                 
@@ -104,10 +104,6 @@ def analyze_from_url(url):
                 
                 progress_bar.progress(100)
                 status_text.text("✅ Analysis complete!")
-                
-                # Cleanup
-                if os.path.exists(video_path):
-                    os.remove(video_path)
             else:
                 st.error("Failed to download video. Please try a different URL or upload a file.")
                 
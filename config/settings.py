@@ -5,15 +5,91 @@ class Config:
     
     # Video processing
     TARGET_FPS = 30
-    MAX_RESOLUTION = (1280, 720)
+    MAX_RESOLUTION = (1280, 720)  # Decoded frames are scaled down to fit (either orientation)
+    
+    # Video decoding (utils/decoders.py)
+    DECODE_BACKEND = "auto"  # "auto", "pyav" or "opencv"
+    DECODE_BACKEND_ORDER = ["pyav", "opencv"]  # Tried in this order by "auto", fastest first
+    DECODE_HWACCEL = True  # Ask OpenCV's FFmpeg backend for hardware decoding where available
+    DECODE_QUEUE_SIZE = 8  # Frames decoded ahead of analysis
     
     # Pose detection
     MIN_DETECTION_CONFIDENCE = 0.5
     MIN_TRACKING_CONFIDENCE = 0.5
     
-    # Biomechanics thresholds
-    OPTIMAL_ELBOW_ANGLE_MIN = 110
-    OPTIMAL_ELBOW_ANGLE_MAX = 140
-    MAX_SPINE_LEAN = 20
-    MAX_HEAD_KNEE_DISTANCE = 0.05
-    MIN_BALANCE_SCORE = 0.7
+    # Scoring rules: thresholds, feedback and recommendations per shot type and age group
+    SCORING_RULES_PATH = "config/scoring_rules.json"
+    SHOT_TYPE = "cover_drive"
+    AGE_GROUP = "senior"
+    RULES_RELOAD_INTERVAL = 2.0  # Seconds between checks for edits to the rules file
+    
+    # Score aggregation
+    AGGREGATE_TRIM = 0.1  # Share of weight trimmed from each end; 0.5 gives the weighted median
+    CONFIDENCE_FLOOR = 0.5  # Landmark visibility that carries no weight (the detection cutoff)
+    
+    # Reference comparison
+    REFERENCE_LIBRARY_PATH = "references/cover_drive_library.npz"
+    REFERENCE_SERIES_LENGTH = 64  # Frames each shot is resampled to
+    DTW_BAND_RATIO = 0.1  # Sakoe-Chiba band as a fraction of series length
+    DTW_BATCH_SIZE = 64
+    REFERENCE_TOP_K = 3
+    
+    # Landmark smoothing (One-Euro filter)
+    SMOOTH_LANDMARKS = True
+    FILTER_MIN_CUTOFF = 1.0  # Hz, smoothing when landmarks are still
+    FILTER_BETA = 10.0  # Cutoff increase per unit of landmark speed
+    FILTER_D_CUTOFF = 1.0  # Hz, for the speed estimate
+    JERK_SCALE = 200.0  # Hand jerk (normalized units/s^3) that halves smoothness
+    
+    # Kinematics and shot phases
+    KINEMATICS_WINDOW = 5  # Frames kept in each ring buffer
+    KINEMATICS_MAX_GAP = 0.2  # Seconds without tracking before the window is dropped
+    SWING_START_SPEED = 0.5  # Hand speed (normalized units/s) that starts the swing
+    IMPACT_SPEED_DROP = 0.6  # Follow-through once hand speed falls below this share of its peak
+    MIN_PHASE_FRAMES = 10
+    
+    # Batter orientation detection
+    ORIENTATION_FRAMES = 8  # Detected frames used to infer handedness and camera view
+    ORIENTATION_MAX_FRAMES = 15  # Most frames held back while waiting for those detections
+    FRONT_ON_SHOULDER_RATIO = 0.5  # Shoulder width / torso length above which the camera is front-on
+    
+    # 3D mode: compute joint angles from MediaPipe world landmarks
+    USE_WORLD_LANDMARKS = False
+    
+    # Remote video ingestion
+    DOWNLOAD_CACHE_DIR = "cache/downloads"
+    DOWNLOAD_CACHE_MAX_BYTES = 2 * 1024 ** 3
+    STREAM_CHUNK_BYTES = 256 * 1024
+    STREAM_PROBE_BYTES = 1024 * 1024  # Bytes downloaded before the stream header is probed
+    STREAM_TIMEOUT = 30  # Seconds
+    
+    # Multi-person mode (bowler, keeper or a second batter in frame)
+    MULTI_PERSON = False
+    MAX_TRACKS = 4
+    MULTI_PERSON_MODEL_COMPLEXITY = 1  # Only 1 ships with mediapipe; 0 (faster) and 2 are downloaded on first use
+    PERSON_DETECT_INTERVAL = 5  # Frames between person-detector runs
+    PERSON_DETECT_WIDTH = 480  # Frames are downscaled to this width for person detection
+    PERSON_DETECT_MIN_SCORE = 0.3
+    PERSON_NMS_IOU = 0.4
+    TRACK_IOU_THRESHOLD = 0.3  # Minimum overlap to match a detection to a track
+    TRACK_DUPLICATE_IOU = 0.5  # Tracks overlapping this much follow the same person
+    TRACK_CROP_MARGIN = 0.25  # Crop padding as a fraction of the person box
+    TRACK_MIN_CROP = 0.5  # Smallest crop side as a fraction of the shorter frame side
+    TRACK_MAX_MISSED = 15  # Frames without a pose before a track ends
+    TRACK_TENTATIVE_FRAMES = 3  # New tracks without a pose by then are dropped
+    
+    # HTTP analysis service (service.py)
+    SERVICE_HOST = "127.0.0.1"
+    SERVICE_PORT = 8080
+    SERVICE_WORKERS = 2  # Analyzer processes, each keeping its pose graph warm
+    SERVICE_MAX_QUEUE = 8  # Jobs waiting for a free worker before new ones are rejected
+    SERVICE_MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+    SERVICE_JOB_DIR = "output/jobs"
+    SERVICE_MAX_JOBS = 100  # Finished jobs kept before the oldest are deleted
+    
+    # Checkpointing: interrupted analyses resume from the last checkpoint
+    CHECKPOINT_INTERVAL = 300  # Frames between checkpoints; 0 disables checkpointing
+    
+    # Startup time (python -m utils.lazy_import)
+    IMPORT_TIME_MODULE = "cover_drive_analysis_realtime"
+    IMPORT_TIME_BUDGET = 0.5  # Seconds
@@ -1,150 +1,336 @@
 # cover_drive_analysis_realtime.py - COMPLETE UPDATED VERSION
-import cv2
 import json
 import time
 import numpy as np
 from pathlib import Path
 from utils.pose_detector import PoseDetector
 from utils.biomechanics import BiomechanicsAnalyzer
+from utils.landmark_filter import LandmarkSmoother
 from utils.video_processor import VideoProcessor
 from utils.evaluator import ShotEvaluator
+from utils.reference_comparison import ReferenceLibrary
+from utils.kinematics import segment_phases
+from utils.orientation import detect_orientation
+from utils.video_source import DownloadCache, StreamingVideoCapture
+from utils.multi_person import MultiPersonAnalyzer
+from utils.checkpoint import AnalysisCheckpoint, join_segments, skip_frames
+from utils.decoders import DecodedVideo
+from utils.lazy_import import lazy_import
 from config.settings import Config
-import yt_dlp
 import os
 
+# cv2 and mediapipe load on first use, keeping imports of this module fast
+cv2 = lazy_import('cv2')
+
 class CoverDriveAnalyzer:
-    def __init__(self):
+    def __init__(self, shot_type=None, age_group=None):
         self.config = Config()
         self.pose_detector = PoseDetector()
         self.biomechanics = BiomechanicsAnalyzer()
-        self.video_processor = VideoProcessor()
-        self.evaluator = ShotEvaluator()
+        self.landmark_smoother = LandmarkSmoother()
+        # Scoring rules for this shot type and age group (Config.SHOT_TYPE / AGE_GROUP by default)
+        self.video_processor = VideoProcessor(shot_type, age_group)
+        self.evaluator = ShotEvaluator(shot_type, age_group)
+        self.download_cache = DownloadCache()
+        
+        # Per-person tracking when more than one person may be in frame
+        self.multi_person = None
+        if self.config.MULTI_PERSON:
+            self.multi_person = MultiPersonAnalyzer(self.video_processor)
+        
+        # Reference shots to compare against, if a library has been built
+        self.reference_library = None
+        if os.path.exists(self.config.REFERENCE_LIBRARY_PATH):
+            self.reference_library = ReferenceLibrary.load(self.config.REFERENCE_LIBRARY_PATH)
         
         # Create output directory
         Path(self.config.OUTPUT_DIR).mkdir(exist_ok=True)
         
-    def download_video(self, url):
-        """Download video from YouTube with latest fixes"""
-        try:
-            ydl_opts = {
-                'format': 'best[height<=720]',
-                'outtmpl': 'input_video.%(ext)s',
-                
-                # Latest user agent and headers
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
-                },
-                
-                # Updated extractor args for 2025
-                'extractor_args': {
-                    'youtube': {
-                        'player_client': ['android', 'web', 'ios'],
-                        'skip': ['dash', 'hls'],
-                        'player_skip': ['configs'],
-                    }
-                },
-                
-                # Enhanced retry settings
-                'retries': 10,
-                'fragment_retries': 10,
-                'extract_flat': False,
-                'writesubtitles': False,
-                'writeautomaticsub': False,
-                
-                # Additional fixes for 403 errors
-                'cookiefile': None,
-                'source_address': '0.0.0.0',
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-                
-            # Find downloaded file
-            for ext in ['mp4', 'webm', 'mkv', 'flv']:
-                if os.path.exists(f'input_video.{ext}'):
-                    return f'input_video.{ext}'
+    def warm_up(self):
+        """Load the pose model ahead of the first video (e.g. when a worker starts)"""
+        start_time = time.time()
+        self.pose_detector.warm_up()
+        if self.multi_person is not None:
+            self.multi_person.warm_up()
+        print(f"🔥 Pose model ready in {time.time() - start_time:.2f}s")
+    
+    def set_orientation(self, detections, aspect_ratio):
+        """Detect batter handedness and camera view and remap the analyzed joints"""
+        orientation = detect_orientation(detections, aspect_ratio)
+        self.biomechanics.set_orientation(orientation)
+        print(f"🧭 {orientation['handedness'].title()}-handed batter, {orientation['view'].replace('_', '-')} view")
+        return orientation
+    
+    def process_frame(self, frame_count, frame, pose_results, fps, frame_metrics):
+        """Analyze and annotate one frame, appending its metrics"""
+        if pose_results:
+            # Temporal smoothing of landmark jitter
+            if self.config.SMOOTH_LANDMARKS:
+                pose_results = self.landmark_smoother.apply(pose_results, frame_count / fps)
             
-            raise FileNotFoundError("Downloaded video not found")
+            # Biomechanical analysis
+            metrics = self.biomechanics.analyze_frame(pose_results, frame_count, fps)
+            frame_metrics.append(metrics)
             
-        except Exception as e:
-            print(f"Error downloading video: {e}")
-            return None
+            # Add overlays
+            frame = self.video_processor.add_overlays(
+                frame, pose_results, metrics, frame_count
+            )
+        else:
+            # Handle missing detection
+            frame = self.video_processor.add_no_detection_overlay(frame)
+        
+        return frame
+    
+    def evaluate_tracks(self, fps, aspect_ratio):
+        """Evaluate every tracked person; the primary track's metrics drive the main evaluation"""
+        self.multi_person.finish(fps, aspect_ratio)
+        primary = self.multi_person.primary_track()
+        
+        track_evaluations = {}
+        for track in self.multi_person.all_tracks():
+            # Brief tracks are usually person-detector false positives
+            if len(track.frame_metrics) < Config.ORIENTATION_FRAMES and track is not primary:
+                continue
+            track_evaluation = self.evaluator.evaluate_shot(track.frame_metrics)
+            track_evaluation['primary'] = track is primary
+            track_evaluation['orientation'] = {
+                'handedness': track.orientation['handedness'],
+                'view': track.orientation['view']
+            }
+            track_evaluations[str(track.id)] = track_evaluation
+        
+        if primary is None:
+            return [], detect_orientation([]), track_evaluations
+        print(f"👥 Tracked {len(track_evaluations)} people, batter is ID {primary.id}")
+        return primary.frame_metrics, primary.orientation, track_evaluations
+    
+    def extract_metrics(self, video_path):
+        """Per-frame metrics of a whole clip, without overlays or an annotated video
+        
+        The offline counterpart of analyze_video: landmarks are smoothed forward and
+        backward over the whole clip, so the metrics carry no filter lag.
+        """
+        try:
+            cap = DecodedVideo(video_path)
+        except IOError as e:
+            raise ValueError(f"Cannot open video: {video_path}") from e
+        fps = cap.get(cv2.CAP_PROP_FPS) or self.config.TARGET_FPS
+        aspect_ratio = cap.get(cv2.CAP_PROP_FRAME_WIDTH) / cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        
+        self.biomechanics.reset()
+        detections = []
+        frame_count = 0
+        while True:
+            ret, frame, rgb_frame = cap.read_pair()
+            if not ret:
+                break
+            frame_count += 1
+            pose_results = self.pose_detector.detect_rgb(rgb_frame)
+            if pose_results:
+                detections.append((frame_count, pose_results))
+        cap.release()
+        
+        # The same detections analyze_video decides the orientation from, so the metrics match
+        window = [p['landmarks_array'] for n, p in detections if n <= self.config.ORIENTATION_MAX_FRAMES]
+        self.set_orientation(window[:self.config.ORIENTATION_FRAMES], aspect_ratio)
+        if self.config.SMOOTH_LANDMARKS:
+            self.landmark_smoother.apply_sequence([p for _, p in detections], [n / fps for n, _ in detections])
+        return [self.biomechanics.analyze_frame(p, n, fps) for n, p in detections]
+    
+    def analyze_url(self, url, output_dir=None, progress_callback=None, time_limit=None):
+        """Analyze a remote video while it downloads (cached by content for repeated URLs)"""
+        return self.analyze_video(StreamingVideoCapture(url, self.download_cache), output_dir,
+                                  progress_callback, time_limit)
+    
+    def open_writer(self, path, fps, width, height):
+        """Video writer with H.264 codec (browser-compatible), falling back to MJPG and XVID"""
+        out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'H264'), fps, (width, height))
+        
+        # If H.264 doesn't work, try MJPG
+        if not out.isOpened():
+            out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+        
+        # If MJPG doesn't work, try XVID
+        if not out.isOpened():
+            out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'XVID'), fps, (width, height))
+        
+        return out
     
-    def analyze_video(self, video_path):
-        """Main analysis function with browser-compatible video output"""
+    def analyze_video(self, video_path, output_dir=None, progress_callback=None, time_limit=None):
+        """Main analysis function with browser-compatible video output
+        
+        video_path may also be an already opened capture (e.g. StreamingVideoCapture).
+        Results go to output_dir (default Config.OUTPUT_DIR); progress_callback, if
+        given, is called with (frames_done, total_frames) about once a second.
+        
+        Progress is checkpointed to output_dir every CHECKPOINT_INTERVAL frames and a
+        rerun with the same video and output_dir resumes from there. With time_limit
+        (seconds), analysis stops at the next checkpoint after the limit and returns
+        {'complete': False, ...}; call again to continue.
+        """
         print("🏏 Starting Cricket Cover Drive Analysis...")
         
-        cap = cv2.VideoCapture(video_path)
+        if hasattr(video_path, 'read'):
+            cap = video_path
+        else:
+            # Decoded on a background thread, scaled to MAX_RESOLUTION
+            try:
+                cap = DecodedVideo(video_path)
+            except IOError as e:
+                raise ValueError(f"Cannot open video: {video_path}") from e
         if not cap.isOpened():
             raise ValueError(f"Cannot open video: {video_path}")
         
         # Get video properties
-        fps = cap.get(cv2.CAP_PROP_FPS)
+        fps = cap.get(cv2.CAP_PROP_FPS) or self.config.TARGET_FPS
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-        # Setup output video writer with H.264 codec (browser-compatible)
-        fourcc = cv2.VideoWriter_fourcc(*'H264')
-        output_path = os.path.join(self.config.OUTPUT_DIR, 'annotated_video.mp4')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-        
-        # If H.264 doesn't work, try MJPG
-        if not out.isOpened():
-            fourcc = cv2.VideoWriter_fourcc(*'MJPG')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-        
-        # If MJPG doesn't work, try XVID
-        if not out.isOpened():
-            fourcc = cv2.VideoWriter_fourcc(*'XVID')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        output_dir = output_dir or self.config.OUTPUT_DIR
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        output_path = os.path.join(output_dir, 'annotated_video.mp4')
         
         # Initialize tracking variables
+        self.biomechanics.reset()
+        self.landmark_smoother.reset()
+        if self.multi_person is not None:
+            self.multi_person.reset()
+            # Fails here, before any output, if the per-track pose model is unavailable
+            self.multi_person.warm_up()
         frame_metrics = []
         frame_count = 0
         start_time = time.time()
         
+        # Frames held back until the batter's orientation is known
+        pending = []
+        orientation = None
+        
+        # Resume from the last checkpoint of an interrupted run
+        # (multi-person tracks are not checkpointed)
+        checkpoint = None
+        segment = 0
+        if self.config.CHECKPOINT_INTERVAL and self.multi_person is None:
+            checkpoint = AnalysisCheckpoint(output_dir, video_path)
+            state = checkpoint.load()
+            if state is not None:
+                frame_metrics = state['frame_metrics']
+                frame_count = state['frame_count']
+                orientation = state['orientation']
+                segment = state['segments']
+                self.biomechanics = state['biomechanics']
+                self.landmark_smoother = state['landmark_smoother']
+                skip_frames(cap, frame_count)
+                print(f"♻️ Resuming from checkpoint at frame {frame_count}")
+        start_frame = segment_start = frame_count
+        metrics_start = len(frame_metrics)
+        
+        # With checkpoints the video is written in segments, joined at the end
+        out = self.open_writer(checkpoint.segment_path(segment) if checkpoint else output_path, fps, width, height)
+        
         print(f"📹 Processing {total_frames} frames at {fps} FPS...")
         
+        # Decoders that also deliver RGB frames save the color conversion before pose detection
+        read_frame = cap.read_pair if hasattr(cap, 'read_pair') else lambda: cap.read() + (None,)
+        
         while True:
-            ret, frame = cap.read()
+            ret, frame, rgb_frame = read_frame()
             if not ret:
                 break
             
             frame_count += 1
             
-            # Pose detection
-            pose_results = self.pose_detector.detect(frame)
-            
-            if pose_results:
-                # Biomechanical analysis
-                metrics = self.biomechanics.analyze_frame(pose_results, frame_count)
-                frame_metrics.append(metrics)
-                
-                # Add overlays
-                frame = self.video_processor.add_overlays(
-                    frame, pose_results, metrics, frame_count
-                )
+            if self.multi_person is not None:
+                out.write(self.multi_person.process_frame(frame, frame_count, fps, rgb_frame))
             else:
-                # Handle missing detection
-                frame = self.video_processor.add_no_detection_overlay(frame)
-            
-            # Write frame
-            out.write(frame)
+                # Pose detection
+                if rgb_frame is not None:
+                    pose_results = self.pose_detector.detect_rgb(rgb_frame)
+                else:
+                    pose_results = self.pose_detector.detect(frame)
+                pending.append((frame_count, frame, pose_results))
+                
+                # Infer handedness and camera view from the first detections
+                if orientation is None:
+                    detections = [p['landmarks_array'] for _, _, p in pending if p]
+                    if (len(detections) >= self.config.ORIENTATION_FRAMES or
+                            len(pending) >= self.config.ORIENTATION_MAX_FRAMES):
+                        orientation = self.set_orientation(detections, width / height)
+                
+                if orientation is not None:
+                    for pending_frame in pending:
+                        out.write(self.process_frame(*pending_frame, fps, frame_metrics))
+                    pending = []
             
             # Progress update
             if frame_count % 30 == 0:  # Every second at 30fps
-                progress = (frame_count / total_frames) * 100
-                print(f"⚡ Progress: {progress:.1f}%")
+                if total_frames:
+                    progress = (frame_count / total_frames) * 100
+                    print(f"⚡ Progress: {progress:.1f}%")
+                if progress_callback is not None:
+                    progress_callback(frame_count, total_frames)
+            
+            # Checkpoint between frames once nothing is held back
+            if checkpoint is None or pending:
+                continue
+            out_of_time = time_limit is not None and time.time() - start_time > time_limit
+            if frame_count - segment_start >= self.config.CHECKPOINT_INTERVAL or out_of_time:
+                out.release()
+                checkpoint.save(segment, frame_metrics[metrics_start:], {
+                    'frame_count': frame_count,
+                    'orientation': orientation,
+                    'biomechanics': self.biomechanics,
+                    'landmark_smoother': self.landmark_smoother
+                })
+                segment += 1
+                segment_start = frame_count
+                metrics_start = len(frame_metrics)
+                
+                if out_of_time:
+                    cap.release()
+                    print(f"⏸️ Time limit reached, checkpoint saved at frame {frame_count}")
+                    return {
+                        'complete': False,
+                        'checkpoint': checkpoint.dir,
+                        'stats': {
+                            'total_frames': frame_count,
+                            'processing_time': time.time() - start_time,
+                            'avg_fps': (frame_count - start_frame) / (time.time() - start_time)
+                        }
+                    }
+                out = self.open_writer(checkpoint.segment_path(segment), fps, width, height)
+        
+        # A failed download ends the stream early; a truncated clip is not evaluated
+        if getattr(cap, 'error', None) is not None:
+            cap.release()
+            out.release()
+            raise ValueError(f"Video download failed: {cap.error}")
+        
+        # Clips shorter than the orientation window
+        if orientation is None and self.multi_person is None:
+            orientation = self.set_orientation([p['landmarks_array'] for _, _, p in pending if p], width / height)
+        for pending_frame in pending:
+            out.write(self.process_frame(*pending_frame, fps, frame_metrics))
+        
+        track_evaluations = None
+        if self.multi_person is not None:
+            frame_metrics, orientation, track_evaluations = self.evaluate_tracks(fps, width / height)
         
         # Cleanup
         cap.release()
         out.release()
         
+        if checkpoint is not None:
+            # The last segment is empty when the video ended right at a checkpoint
+            segments = segment + 1 if frame_count > segment_start else segment
+            join_segments(checkpoint.segments(segments), output_path,
+                          lambda path: self.open_writer(path, fps, width, height))
+        
         # Calculate processing stats
         end_time = time.time()
         processing_time = end_time - start_time
-        avg_fps = frame_count / processing_time
+        avg_fps = (frame_count - start_frame) / processing_time
         
         print(f"✅ Processing complete!")
         print(f"📊 Processed {frame_count} frames in {processing_time:.2f}s")
@@ -152,15 +338,34 @@ class CoverDriveAnalyzer:
         
         # Generate evaluation
         evaluation = self.evaluator.evaluate_shot(frame_metrics)
+        evaluation['orientation'] = {
+            'handedness': orientation['handedness'],
+            'view': orientation['view']
+        }
+        if track_evaluations is not None:
+            evaluation['tracks'] = track_evaluations
+        
+        # Compare against reference cover drives
+        if self.reference_library is not None and frame_metrics:
+            comparison = self.reference_library.compare(frame_metrics, segment_phases(frame_metrics))
+            if comparison:
+                evaluation['reference_comparison'] = comparison
         
-        # Save evaluation
-        eval_path = os.path.join(self.config.OUTPUT_DIR, 'evaluation.json')
+        # Save evaluation, and the metrics so the session can be re-scored under other rules
+        eval_path = os.path.join(output_dir, 'evaluation.json')
         with open(eval_path, 'w') as f:
             json.dump(evaluation, f, indent=2)
+        with open(os.path.join(output_dir, 'frame_metrics.json'), 'w') as f:
+            json.dump(frame_metrics, f)
+        
+        if checkpoint is not None:
+            checkpoint.clear()
         
         return {
+            'complete': True,
             'output_video': output_path,
             'evaluation': evaluation,
+            'frame_metrics': frame_metrics,
             'stats': {
                 'total_frames': frame_count,
                 'processing_time': processing_time,
@@ -174,29 +379,23 @@ def main():
     
     analyzer = CoverDriveAnalyzer()
     
-    # Download video
-    print("📥 Downloading video...")
-    video_path = analyzer.download_video(video_url)
+    # Stream, download and analyze in one pass
+    print("📥 Streaming video...")
+    try:
+        results = analyzer.analyze_url(video_url)
+    except ValueError as e:
+        print(f"❌ Failed to load video: {e}")
+        return
     
-    if video_path:
-        # Analyze video
-        results = analyzer.analyze_video(video_path)
-        
-        print("\n🎯 Analysis Results:")
-        print(f"📄 Evaluation saved to: output/evaluation.json")
-        print(f"🎬 Annotated video saved to: {results['output_video']}")
-        
-        # Print summary scores
-        evaluation = results['evaluation']
-        print(f"\n📊 Shot Scores:")
-        for category, data in evaluation['scores'].items():
-            print(f"  {category}: {data['score']}/10 - {data['feedback']}")
-        
-        # Cleanup
-        if os.path.exists(video_path):
-            os.remove(video_path)
-    else:
-        print("❌ Failed to download video")
+    print("\n🎯 Analysis Results:")
+    print(f"📄 Evaluation saved to: output/evaluation.json")
+    print(f"🎬 Annotated video saved to: {results['output_video']}")
+    
+    # Print summary scores
+    evaluation = results['evaluation']
+    print(f"\n📊 Shot Scores:")
+    for category, data in evaluation['scores'].items():
+        print(f"  {category}: {data['score']}/10 - {data['feedback']}")
 
 if __name__ == "__main__":
     main()
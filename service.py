@@ -0,0 +1,403 @@
+# service.py - Headless HTTP/JSON analysis API
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from aiohttp import web
+from config.settings import Config
+from utils.evaluator import ShotEvaluator
+
+VIDEO_TYPES = {
+    'video/mp4': '.mp4',
+    'video/quicktime': '.mov',
+    'video/x-msvideo': '.avi',
+    'video/x-matroska': '.mkv',
+    'video/webm': '.webm'
+}
+
+# Worker process state: one analyzer per process, built once by the pool initializer
+_analyzer = None
+_progress_queue = None
+
+def init_worker(progress_queue):
+    """Load the pose graph once per worker process, so jobs start warm"""
+    global _analyzer, _progress_queue
+    from cover_drive_analysis_realtime import CoverDriveAnalyzer
+    _analyzer = CoverDriveAnalyzer()
+    _analyzer.warm_up()
+    _progress_queue = progress_queue
+
+def warm_up():
+    return os.getpid()
+
+def run_job(job_id, source, job_dir):
+    """Analyze one clip in a worker process; source is a file path or a URL"""
+    def report(frames_done, total_frames):
+        _progress_queue.put((job_id, frames_done, total_frames))
+
+    if source.startswith(('http://', 'https://')):
+        results = _analyzer.analyze_url(source, job_dir, report)
+    else:
+        results = _analyzer.analyze_video(source, job_dir, report)
+
+    # frame_metrics stay in the worker; the evaluation is also saved in job_dir
+    return {
+        'evaluation': results['evaluation'],
+        'output_video': results['output_video'],
+        'stats': results['stats']
+    }
+
+class Job:
+    """One submitted clip and its progress"""
+
+    def __init__(self, source=None):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.dir = os.path.join(Config.SERVICE_JOB_DIR, self.id)
+        self.status = 'queued'
+        self.frames_done = 0
+        self.total_frames = 0
+        self.error = None
+        self.result = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.changed = asyncio.Event()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def update(self, **fields):
+        """Change job fields and wake everyone waiting on this job"""
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def to_dict(self):
+        progress = self.frames_done / self.total_frames if self.total_frames else None
+        if self.status == 'done':
+            progress = 1.0
+        info = {
+            'job_id': self.id,
+            'status': self.status,
+            'progress': None if progress is None else round(min(progress, 1.0), 3),
+            'frames_done': self.frames_done,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if self.error:
+            info['error'] = self.error
+        if self.result:
+            info['stats'] = self.result['stats']
+            info['overall_score'] = self.result['evaluation'].get('overall_score')
+        return info
+
+class AnalysisService:
+    """Queues jobs, admits them up to a limit and runs them on a pool of warm analyzers"""
+
+    def __init__(self, workers=None, max_queue=None):
+        self.workers = workers or Config.SERVICE_WORKERS
+        self.max_queue = Config.SERVICE_MAX_QUEUE if max_queue is None else max_queue
+        self.jobs = {}
+        self.queue = asyncio.Queue()
+        self.running = 0
+        self.uploading = 0
+        self.ready = False
+        self.pool = None
+        # Held while the pool is replaced, so dispatchers never submit to a broken one
+        self.pool_lock = asyncio.Lock()
+        self.counters = {'submitted': 0, 'rejected': 0, 'done': 0, 'failed': 0}
+        self.processing_seconds = 0.0
+        self.context = multiprocessing.get_context('spawn')
+        self.progress_queue = self.context.Queue()
+
+    async def start(self, app=None):
+        self.loop = asyncio.get_running_loop()
+        os.makedirs(Config.SERVICE_JOB_DIR, exist_ok=True)
+        self.progress_reader = threading.Thread(target=self.read_progress, daemon=True)
+        self.progress_reader.start()
+        self.dispatchers = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+        await self.start_pool()
+
+    async def start_pool(self):
+        """Start the worker processes and wait until each has loaded its analyzer"""
+        self.ready = False
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=self.context,
+            initializer=init_worker, initargs=(self.progress_queue,)
+        )
+        pids = await asyncio.gather(*[
+            self.loop.run_in_executor(self.pool, warm_up) for _ in range(self.workers)
+        ])
+        self.ready = True
+        print(f"🔥 {len(set(pids))} analyzer workers ready")
+
+    async def stop(self, app=None):
+        for task in self.dispatchers:
+            task.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.progress_queue.put(None)
+
+    def read_progress(self):
+        """Forward progress messages from the workers to the event loop"""
+        while True:
+            message = self.progress_queue.get()
+            if message is None:
+                return
+            self.loop.call_soon_threadsafe(self.on_progress, *message)
+
+    def on_progress(self, job_id, frames_done, total_frames):
+        job = self.jobs.get(job_id)
+        if job is not None and not job.finished:
+            job.update(frames_done=frames_done, total_frames=total_frames)
+
+    def queued(self):
+        return sum(1 for job in self.jobs.values() if job.status == 'queued')
+
+    def admit(self):
+        """Admission control: jobs beyond the busy workers plus max_queue are rejected
+
+        Uploads still streaming in hold a slot, so they are counted too.
+        """
+        return self.queued() + self.running + self.uploading < self.workers + self.max_queue
+
+    def submit(self, job):
+        self.jobs[job.id] = job
+        self.counters['submitted'] += 1
+        self.queue.put_nowait(job)
+
+    async def dispatch(self):
+        """Run queued jobs one at a time; one dispatcher per worker process"""
+        while True:
+            job = await self.queue.get()
+            self.running += 1
+            job.update(status='running', started_at=time.time())
+            async with self.pool_lock:
+                pool = self.pool
+            try:
+                result = await self.loop.run_in_executor(pool, run_job, job.id, job.source, job.dir)
+                job.update(status='done', result=result, finished_at=time.time())
+                self.counters['done'] += 1
+            except Exception as e:
+                print(f"❌ Job {job.id} failed: {e}")
+                job.update(status='failed', error=str(e) or type(e).__name__, finished_at=time.time())
+                self.counters['failed'] += 1
+                if isinstance(e, BrokenProcessPool):
+                    # A worker died (e.g. out of memory); replace the whole pool
+                    await self.replace_pool(pool)
+            finally:
+                self.running -= 1
+                self.processing_seconds += time.time() - job.started_at
+
+    async def replace_pool(self, broken):
+        """Replace a broken pool once, however many of its jobs failed with it"""
+        async with self.pool_lock:
+            if self.pool is not broken:
+                return  # Another dispatcher already replaced it
+            broken.shutdown(wait=False, cancel_futures=True)
+            await self.start_pool()
+
+    async def evict(self):
+        """Delete the oldest finished jobs beyond SERVICE_MAX_JOBS"""
+        finished = sorted((job for job in self.jobs.values() if job.finished), key=lambda job: job.finished_at)
+        evicted = finished[:max(0, len(finished) - Config.SERVICE_MAX_JOBS)]
+        for job in evicted:
+            del self.jobs[job.id]
+        # Off the event loop: removing a job's video and checkpoints can take a while on a slow disk
+        for job in evicted:
+            await asyncio.to_thread(shutil.rmtree, job.dir, ignore_errors=True)
+
+    def metrics(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for name, value in self.counters.items():
+            lines.append(f'cricket_jobs_total{{outcome="{name}"}} {value}')
+        lines += [
+            f'cricket_jobs_queued {self.queued()}',
+            f'cricket_jobs_running {self.running}',
+            f'cricket_uploads_in_progress {self.uploading}',
+            f'cricket_workers {self.workers}',
+            f'cricket_workers_ready {int(self.ready)}',
+            f'cricket_processing_seconds_total {self.processing_seconds:.3f}'
+        ]
+        return '\n'.join(lines) + '\n'
+
+def json_error(status, message, **headers):
+    return web.json_response({'error': message}, status=status, headers=headers)
+
+routes = web.RouteTableDef()
+
+@routes.post('/jobs')
+async def submit_job(request):
+    """Submit a clip: raw video bytes in the body, or JSON {"url": ...}"""
+    service = request.app['service']
+    if not service.admit():
+        service.counters['rejected'] += 1
+        return json_error(503, 'Analysis queue is full, try again later', **{'Retry-After': '30'})
+
+    # Hold the admitted slot while the body is read; released when the job is queued or rejected
+    service.uploading += 1
+    try:
+        job = await receive_job(request)
+        if isinstance(job, web.Response):
+            return job
+        service.submit(job)
+    finally:
+        service.uploading -= 1
+    await service.evict()
+    return web.json_response(job.to_dict(), status=202, headers={'Location': f'/jobs/{job.id}'})
+
+async def receive_job(request):
+    """Job for a submitted URL or uploaded video, or an error response"""
+    if request.content_type == 'application/json':
+        try:
+            url = (await request.json()).get('url')
+        except (ValueError, AttributeError):
+            url = None
+        if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+            return json_error(400, 'Expected {"url": "http(s)://..."}')
+        job = Job(url)
+        await asyncio.to_thread(os.makedirs, job.dir)
+        return job
+
+    if request.content_length is not None and request.content_length > Config.SERVICE_MAX_UPLOAD_BYTES:
+        return json_error(413, 'Video is too large')
+    job = Job()
+    await asyncio.to_thread(os.makedirs, job.dir)
+    job.source = os.path.join(job.dir, 'input' + VIDEO_TYPES.get(request.content_type, '.mp4'))
+
+    # Stream the upload to disk instead of holding it in memory; disk writes
+    # run on a thread so a slow disk never stalls other requests
+    size = 0
+    try:
+        f = await asyncio.to_thread(open, job.source, 'wb')
+        try:
+            async for chunk in request.content.iter_chunked(1024 * 1024):
+                size += len(chunk)
+                if size > Config.SERVICE_MAX_UPLOAD_BYTES:
+                    break
+                await asyncio.to_thread(f.write, chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+    except Exception:
+        # Client went away mid-upload
+        await asyncio.to_thread(shutil.rmtree, job.dir, ignore_errors=True)
+        raise
+    if size > Config.SERVICE_MAX_UPLOAD_BYTES or size == 0:
+        await asyncio.to_thread(shutil.rmtree, job.dir, ignore_errors=True)
+        return json_error(413 if size else 400, 'Video is too large' if size else 'Empty request body')
+    return job
+
+def get_job(request):
+    job = request.app['service'].jobs.get(request.match_info['job_id'])
+    if job is None:
+        raise web.HTTPNotFound(text=json.dumps({'error': 'Unknown job'}), content_type='application/json')
+    return job
+
+@routes.get('/jobs/{job_id}')
+async def job_status(request):
+    return web.json_response(get_job(request).to_dict())
+
+@routes.get('/jobs/{job_id}/events')
+async def job_events(request):
+    """Server-sent events with the job status until it finishes"""
+    job = get_job(request)
+    response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+    await response.prepare(request)
+
+    while True:
+        changed = job.changed
+        await response.write(f"data: {json.dumps(job.to_dict())}\n\n".encode())
+        if job.finished:
+            break
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=15)
+        except asyncio.TimeoutError:
+            await response.write(b": keep-alive\n\n")
+
+    await response.write_eof()
+    return response
+
+def finished_job(request):
+    job = get_job(request)
+    if job.status == 'failed':
+        raise web.HTTPConflict(text=json.dumps({'error': job.error}), content_type='application/json')
+    if job.status != 'done':
+        raise web.HTTPConflict(text=json.dumps({'error': f'Job is {job.status}'}), content_type='application/json')
+    return job
+
+def rescore(evaluator, metrics_path):
+    """Scores of a finished job's stored metrics; blocking, so run on a thread"""
+    with open(metrics_path) as f:
+        frame_metrics = json.load(f)
+    return evaluator.evaluate_shot(frame_metrics)
+
+@routes.get('/jobs/{job_id}/evaluation')
+async def job_evaluation(request):
+    """Evaluation JSON; ?shot_type=...&age_group=... re-scores the stored metrics under those rules"""
+    job = finished_job(request)
+    evaluation = job.result['evaluation']
+    shot_type, age_group = request.query.get('shot_type'), request.query.get('age_group')
+    if shot_type is None and age_group is None:
+        return web.json_response(evaluation)
+
+    try:
+        evaluator = await asyncio.to_thread(ShotEvaluator, shot_type, age_group)
+    except ValueError as e:
+        return json_error(400, str(e))
+    scores = await asyncio.to_thread(rescore, evaluator, os.path.join(job.dir, 'frame_metrics.json'))
+    return web.json_response(dict(evaluation, **scores))
+
+@routes.get('/jobs/{job_id}/video')
+async def job_video(request):
+    path = finished_job(request).result['output_video']
+    if not os.path.exists(path):
+        return json_error(404, 'Annotated video not found')
+    return web.FileResponse(path, headers={'Content-Type': 'video/mp4'})
+
+@routes.get('/health')
+async def health(request):
+    service = request.app['service']
+    return web.json_response({
+        'status': 'ok' if service.ready else 'starting',
+        'workers': service.workers,
+        'queued': service.queued(),
+        'running': service.running
+    }, status=200 if service.ready else 503)
+
+@routes.get('/metrics')
+async def metrics(request):
+    return web.Response(text=request.app['service'].metrics(), content_type='text/plain')
+
+def create_app(workers=None, max_queue=None):
+    service = AnalysisService(workers, max_queue)
+    app = web.Application(client_max_size=Config.SERVICE_MAX_UPLOAD_BYTES)
+    app['service'] = service
+    app.add_routes(routes)
+    app.on_startup.append(service.start)
+    app.on_cleanup.append(service.stop)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Cricket cover drive analysis HTTP API")
+    parser.add_argument('--host', default=Config.SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=Config.SERVICE_PORT)
+    parser.add_argument('--workers', type=int, default=Config.SERVICE_WORKERS)
+    parser.add_argument('--max-queue', type=int, default=Config.SERVICE_MAX_QUEUE)
+    args = parser.parse_args()
+
+    print(f"🏏 Analysis API on http://{args.host}:{args.port}")
+    web.run_app(create_app(args.workers, args.max_queue), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
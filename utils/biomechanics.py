@@ -1,35 +1,143 @@
 # utils/biomechanics.py - COMPLETE FILE
 import numpy as np
 import math
+from config.settings import Config
+from utils.kinematics import KinematicsTracker
+from utils.orientation import DEFAULT_ORIENTATION
+
+# Per-frame metrics that feed scoring and reference comparison, in column order
+METRIC_KEYS = ['elbow_angle', 'spine_lean', 'head_knee_alignment', 'foot_direction', 'balance_score']
+
+# Every numeric metric a frame can carry, for checks that only need one frame
+FRAME_METRIC_KEYS = METRIC_KEYS + [
+    'smoothness', 'hand_speed', 'hand_jerk', 'hand_height', 'forearm_angular_velocity', 'elbow_angular_velocity'
+]
+
+def metrics_to_array(frame_metrics, keys=METRIC_KEYS):
+    """Stack per-frame metric dicts into an (frames, metrics) array, NaN where missing"""
+    array = np.full((len(frame_metrics), len(keys)), np.nan)
+    for row, metrics in enumerate(frame_metrics):
+        for col, key in enumerate(keys):
+            value = metrics.get(key)
+            if value is not None:
+                array[row, col] = value
+    return array
 
 class BiomechanicsAnalyzer:
     def __init__(self):
         self.previous_metrics = None
+        self.kinematics = KinematicsTracker()
+        self.set_orientation(DEFAULT_ORIENTATION)
+    
+    def reset(self):
+        """Clear per-clip state before analyzing a new video"""
+        self.previous_metrics = None
+        self.kinematics.reset()
+        self.set_orientation(DEFAULT_ORIENTATION)
+    
+    def set_orientation(self, orientation):
+        """Use the joints and view detected for this batter (see utils.orientation)"""
+        self.orientation = orientation
+        self.joints = orientation['joints']
+        self.kinematics.joints = orientation['joints']
         
-    def analyze_frame(self, pose_results, frame_number):
+    def analyze_frame(self, pose_results, frame_number, fps=30.0):
         """Analyze biomechanics for current frame"""
         landmarks = pose_results['landmarks']
+        timestamp = frame_number / fps
+        
+        # True 3D angles when world landmarks are available, image-plane angles otherwise
+        world_landmarks = pose_results.get('world_landmarks_array')
+        if world_landmarks is not None:
+            angles = self.calculate_angles_3d(world_landmarks)
+        else:
+            angles = {
+                'elbow_angle': self.calculate_elbow_angle(landmarks),
+                'spine_lean': self.calculate_spine_lean(landmarks),
+                'foot_direction': self.calculate_foot_direction(landmarks)
+            }
         
         metrics = {
             'frame': frame_number,
-            'timestamp': frame_number / 30.0,
-            'elbow_angle': self.calculate_elbow_angle(landmarks),
-            'spine_lean': self.calculate_spine_lean(landmarks),
+            'timestamp': timestamp,
+            'elbow_angle': angles['elbow_angle'],
+            'spine_lean': angles['spine_lean'],
             'head_knee_alignment': self.calculate_head_knee_alignment(landmarks),
-            'foot_direction': self.calculate_foot_direction(landmarks),
-            'balance_score': self.calculate_balance(landmarks),
-            'smoothness': self.calculate_smoothness(landmarks)
+            'foot_direction': angles['foot_direction'],
+            'balance_score': self.calculate_balance(landmarks)
         }
         
+        # How far each metric can be trusted, from the visibility of its landmarks
+        metrics['confidence'] = self.calculate_confidence(pose_results['landmarks_array'])
+        
+        # Velocities and shot phase from the sliding window
+        metrics.update(self.kinematics.update(
+            pose_results['landmarks_array'], timestamp, frame_number, metrics['elbow_angle']
+        ))
+        metrics['smoothness'] = self.calculate_smoothness(metrics['hand_jerk'])
+        
         self.previous_metrics = metrics
         return metrics
     
+    def calculate_confidence(self, landmarks_array):
+        """Confidence of each scored metric: the lowest visibility among the landmarks it uses"""
+        joints = self.joints
+        landmark_sets = {
+            'elbow_angle': [joints['arm_shoulder'], joints['arm_elbow'], joints['arm_wrist']],
+            'spine_lean': [11, 12, 23, 24],
+            'head_knee_alignment': [0, joints['front_knee']],
+            'foot_direction': [joints['front_knee'], joints['front_ankle']],
+            'balance_score': [23, 24, 27, 28]
+        }
+        visibility = landmarks_array[:, 3]
+        return {key: float(visibility[ids].min()) for key, ids in landmark_sets.items()}
+    
+    def calculate_angles_3d(self, world_landmarks):
+        """Calculate elbow angle, spine lean and foot direction from 3D world landmarks in one pass"""
+        joints = self.joints
+        hip_mid = (world_landmarks[23, :3] + world_landmarks[24, :3]) / 2
+        shoulder_mid = (world_landmarks[11, :3] + world_landmarks[12, :3]) / 2
+        
+        # World y points down; forward is along the batter's facing direction,
+        # or towards the camera for a front-on view
+        if self.orientation['view'] == 'front_on':
+            forward = np.array([0.0, 0.0, -1.0])
+        else:
+            forward = np.array([float(self.orientation['facing']), 0.0, 0.0])
+        
+        first = np.array([
+            world_landmarks[joints['arm_shoulder'], :3] - world_landmarks[joints['arm_elbow'], :3],
+            shoulder_mid - hip_mid,
+            world_landmarks[joints['front_ankle'], :3] - world_landmarks[joints['front_knee'], :3]
+        ])
+        second = np.array([
+            world_landmarks[joints['arm_wrist'], :3] - world_landmarks[joints['arm_elbow'], :3],
+            [0.0, -1.0, 0.0],
+            forward
+        ])
+        
+        norms = np.linalg.norm(first, axis=1) * np.linalg.norm(second, axis=1)
+        cos_angles = np.einsum('ij,ij->i', first, second) / np.maximum(norms, 1e-9)
+        angles = np.degrees(np.arccos(np.clip(cos_angles, -1.0, 1.0)))
+        
+        visible = world_landmarks[:, 3] > 0.5
+        valid = [
+            visible[[joints['arm_shoulder'], joints['arm_elbow'], joints['arm_wrist']]].all(),
+            visible[[11, 12, 23, 24]].all(),
+            visible[[joints['front_knee'], joints['front_ankle']]].all()
+        ]
+        
+        return {
+            key: float(angle) if ok and norm > 1e-9 else None
+            for key, angle, ok, norm in zip(['elbow_angle', 'spine_lean', 'foot_direction'], angles, valid, norms)
+        }
+    
     def calculate_elbow_angle(self, landmarks):
         """Calculate front elbow angle"""
         try:
-            shoulder = landmarks[12]  # right_shoulder
-            elbow = landmarks[14]    # right_elbow
-            wrist = landmarks[16]    # right_wrist
+            shoulder = landmarks[self.joints['arm_shoulder']]
+            elbow = landmarks[self.joints['arm_elbow']]
+            wrist = landmarks[self.joints['arm_wrist']]
             
             if all(point['visibility'] > 0.5 for point in [shoulder, elbow, wrist]):
                 vec1 = np.array([shoulder['x'] - elbow['x'], shoulder['y'] - elbow['y']])
@@ -70,23 +178,27 @@ class BiomechanicsAnalyzer:
         """Calculate head-knee alignment"""
         try:
             nose = landmarks[0]
-            left_knee = landmarks[25]
+            front_knee = landmarks[self.joints['front_knee']]
             
-            if all(point['visibility'] > 0.5 for point in [nose, left_knee]):
-                return abs(nose['x'] - left_knee['x'])
+            if all(point['visibility'] > 0.5 for point in [nose, front_knee]):
+                return abs(nose['x'] - front_knee['x'])
         except:
             pass
         return None
     
     def calculate_foot_direction(self, landmarks):
         """Calculate foot direction"""
+        # The front shin barely moves in the image plane of a front-on camera
+        if self.orientation['view'] == 'front_on':
+            return None
+        
         try:
-            left_ankle = landmarks[27]
-            left_knee = landmarks[25]
+            front_ankle = landmarks[self.joints['front_ankle']]
+            front_knee = landmarks[self.joints['front_knee']]
             
-            if all(point['visibility'] > 0.5 for point in [left_ankle, left_knee]):
-                foot_vector = np.array([left_ankle['x'] - left_knee['x'], left_ankle['y'] - left_knee['y']])
-                horizontal = np.array([1, 0])
+            if all(point['visibility'] > 0.5 for point in [front_ankle, front_knee]):
+                foot_vector = np.array([front_ankle['x'] - front_knee['x'], front_ankle['y'] - front_knee['y']])
+                horizontal = np.array([self.orientation['facing'], 0])
                 
                 cos_angle = np.dot(foot_vector, horizontal) / np.linalg.norm(foot_vector)
                 angle = math.degrees(math.acos(np.clip(cos_angle, -1.0, 1.0)))
@@ -115,6 +227,8 @@ class BiomechanicsAnalyzer:
             pass
         return None
     
-    def calculate_smoothness(self, landmarks):
-        """Calculate movement smoothness"""
-        return 0.8  # Simplified
+    def calculate_smoothness(self, hand_jerk):
+        """Calculate movement smoothness from the jerk of the hands (bat grip)"""
+        if hand_jerk is None:
+            return None
+        return float(1.0 / (1.0 + hand_jerk / Config.JERK_SCALE))
@@ -0,0 +1,129 @@
+# utils/checkpoint.py - Checkpoints for resumable video analysis
+import os
+import pickle
+import shutil
+import subprocess
+from config.settings import Config
+from utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+# Settings that change the analysis results; a checkpoint made under others is not resumed
+KEY_SETTINGS = [
+    'MAX_RESOLUTION', 'USE_WORLD_LANDMARKS', 'SMOOTH_LANDMARKS',
+    'FILTER_MIN_CUTOFF', 'FILTER_BETA', 'FILTER_D_CUTOFF'
+]
+
+def source_key(video_path):
+    """Identifies an input and the settings, so a checkpoint is only resumed for the same run"""
+    settings = tuple(repr(getattr(Config, name)) for name in KEY_SETTINGS)
+    if isinstance(video_path, (str, bytes, os.PathLike)):
+        video_path = os.fspath(video_path)
+        stat = os.stat(video_path)
+        return (os.path.abspath(video_path), stat.st_size, stat.st_mtime, settings)
+    return (repr(video_path), settings)
+
+class AnalysisCheckpoint:
+    """Progress of one analyze_video run, saved as a series of segments
+
+    Each segment is a finished annotated video file plus the metrics of its
+    frames, so saving is append-only; state.pkl holds the frame index and
+    the filter/tracker state needed to continue from the end of the last one.
+    """
+
+    def __init__(self, output_dir, video_path):
+        self.dir = os.path.join(output_dir, 'checkpoint')
+        self.state_path = os.path.join(self.dir, 'state.pkl')
+        self.key = source_key(video_path)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def segment_path(self, index):
+        return os.path.join(self.dir, f'segment_{index:05d}.mp4')
+
+    def metrics_path(self, index):
+        return os.path.join(self.dir, f'metrics_{index:05d}.pkl')
+
+    def load(self):
+        """Saved state with all checkpointed frame_metrics, or None to start from frame 0"""
+        try:
+            with open(self.state_path, 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+        if state.get('key') != self.key:
+            print("⚠️ Checkpoint is for a different video or settings, starting over")
+            self.clear()
+            os.makedirs(self.dir, exist_ok=True)
+            return None
+
+        frame_metrics = []
+        for index in range(state['segments']):
+            with open(self.metrics_path(index), 'rb') as f:
+                frame_metrics.extend(pickle.load(f))
+        state['frame_metrics'] = frame_metrics
+        return state
+
+    def save(self, segment_index, segment_metrics, state):
+        """Record a finished segment; the state file is replaced atomically"""
+        with open(self.metrics_path(segment_index), 'wb') as f:
+            pickle.dump(segment_metrics, f)
+
+        state = dict(state, key=self.key, segments=segment_index + 1)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def segments(self, count):
+        return [self.segment_path(index) for index in range(count)]
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+def skip_frames(cap, count):
+    """Move a capture past the first `count` frames"""
+    if count and hasattr(cap, 'set') and cap.set(cv2.CAP_PROP_POS_FRAMES, count):
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == count:
+            return
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    # Streams and inexact seeks: decode and drop
+    for _ in range(count):
+        ret, _ = cap.read()
+        if not ret:
+            break
+
+def join_segments(segment_paths, output_path, open_writer):
+    """Concatenate annotated video segments into output_path
+
+    Uses ffmpeg's concat demuxer (no re-encoding) when available, otherwise
+    re-encodes the frames with a writer from open_writer(path).
+    """
+    if len(segment_paths) == 1:
+        os.replace(segment_paths[0], output_path)
+        return
+
+    if shutil.which('ffmpeg') is not None:
+        list_path = output_path + '.segments.txt'
+        with open(list_path, 'w') as f:
+            for path in segment_paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        result = subprocess.run(
+            ['ffmpeg', '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', output_path],
+            capture_output=True
+        )
+        os.remove(list_path)
+        if result.returncode == 0:
+            return
+
+    out = open_writer(output_path)
+    for path in segment_paths:
+        cap = cv2.VideoCapture(path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            out.write(frame)
+        cap.release()
+    out.release()
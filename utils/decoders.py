@@ -0,0 +1,281 @@
+# utils/decoders.py - Pluggable video decode backends
+import queue
+import sys
+import threading
+import time
+import numpy as np
+from config.settings import Config
+from utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+av = lazy_import('av')
+
+def output_size(width, height, max_resolution=None):
+    """Frame size scaled down to fit MAX_RESOLUTION in either orientation; never upscales"""
+    max_long, max_short = sorted(max_resolution or Config.MAX_RESOLUTION, reverse=True)
+    scale = min(1.0, max_long / max(width, height), max_short / min(width, height))
+    if scale >= 1.0:
+        return width, height
+    # Even dimensions keep every encoder happy
+    return int(width * scale) // 2 * 2, int(height * scale) // 2 * 2
+
+class OpenCVBackend:
+    """cv2.VideoCapture on the FFmpeg backend with hardware decoding and codec threads requested"""
+    name = 'opencv'
+    color = 'bgr'
+
+    def __init__(self, path):
+        self.path = path
+        self.capture = self._open()
+
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.source_size = (
+            int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        )
+        self.width, self.height = output_size(*self.source_size)
+
+    def _open(self):
+        params = [cv2.CAP_PROP_N_THREADS, 0]  # 0: one decoder thread per core
+        if Config.DECODE_HWACCEL:
+            params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        capture = cv2.VideoCapture(self.path, cv2.CAP_FFMPEG, params)
+        if not capture.isOpened():
+            capture = cv2.VideoCapture(self.path)
+        if not capture.isOpened():
+            raise IOError(f"OpenCV cannot open {self.path}")
+        return capture
+
+    def seek(self, index):
+        """Make frame `index` the next one read"""
+        if self.capture.set(cv2.CAP_PROP_POS_FRAMES, index) and int(self.capture.get(cv2.CAP_PROP_POS_FRAMES)) == index:
+            return
+        # No exact seek in this file: decode from the start, but skip retrieving and scaling frames
+        self.capture.release()
+        self.capture = self._open()
+        for _ in range(index):
+            if not self.capture.grab():
+                break
+
+    def read(self):
+        ret, frame = self.capture.read()
+        if not ret:
+            return None
+        if (frame.shape[1], frame.shape[0]) != (self.width, self.height):
+            # Area averaging avoids aliasing on big reductions (4K) but is ~5x slower than linear
+            interpolation = cv2.INTER_AREA if frame.shape[1] >= 2 * self.width else cv2.INTER_LINEAR
+            frame = cv2.resize(frame, (self.width, self.height), interpolation=interpolation)
+        return frame
+
+    def close(self):
+        self.capture.release()
+
+class PyAVBackend:
+    """PyAV with frame- and slice-threaded decoding; scaling and RGB conversion happen in swscale"""
+    name = 'pyav'
+    color = 'rgb'
+
+    def __init__(self, path):
+        self.path = path
+        self.container = av.open(path)
+        self.stream = stream = self.container.streams.video[0]
+        stream.thread_type = 'AUTO'
+        self.frames = self.container.decode(stream)
+
+        self.fps = float(stream.average_rate or stream.guessed_rate or 0)
+        self.frame_count = stream.frames
+
+        # Phone videos are often stored sideways with a rotation tag; the first
+        # frame tells us which way, and so the size of the upright output
+        # (`first` is a decoded frame still to be returned by read())
+        self.first = next(self.frames, None)
+        if self.first is None:
+            self.container.close()
+            raise IOError(f"PyAV found no frames in {path}")
+        self.start_time = self.first.time
+        self.turns = round(getattr(self.first, 'rotation', 0) / 90) % 4
+        width, height = stream.codec_context.width, stream.codec_context.height
+        self.decode_size = output_size(width, height)
+        self.width, self.height = self.decode_size[::-1] if self.turns % 2 else self.decode_size
+
+    def seek(self, index):
+        """Make frame `index` the next one read; assumes a constant frame rate, as frame_count does"""
+        self.first = None
+        if self.fps and self.start_time is not None:
+            target = self.start_time + index / self.fps
+            try:
+                # Jump to the keyframe before the target, then decode up to it without converting frames
+                self.container.seek(int(target / self.stream.time_base), stream=self.stream)
+                self.frames = self.container.decode(self.stream)
+                for frame in self.frames:
+                    if frame.time is not None and frame.time >= target - 0.5 / self.fps:
+                        self.first = frame
+                        return
+                return
+            except av.error.FFmpegError:
+                pass
+
+        # Not seekable: decode from the start without converting frames
+        self.container.close()
+        self.container = av.open(self.path)
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = 'AUTO'
+        self.frames = self.container.decode(self.stream)
+        for _ in range(index):
+            if next(self.frames, None) is None:
+                break
+
+    def read(self):
+        if self.first is not None:
+            frame, self.first = self.first, None
+        else:
+            frame = next(self.frames, None)
+        if frame is None:
+            return None
+        width, height = self.decode_size
+        array = frame.to_ndarray(format='rgb24', width=width, height=height, interpolation='AREA')
+        if self.turns:
+            array = np.rot90(array, self.turns)
+        return np.ascontiguousarray(array)
+
+    def close(self):
+        self.container.close()
+
+BACKENDS = {backend.name: backend for backend in (PyAVBackend, OpenCVBackend)}
+
+class DecodedVideo:
+    """cv2.VideoCapture-like reader that decodes on a background thread
+
+    Frames come out at or below MAX_RESOLUTION. The thread also produces the
+    color conversion the backend does not deliver natively, so read_pair()
+    hands the main thread both the BGR frame (drawing, encoding) and the RGB
+    frame (pose inference) with no conversion work left to do.
+    """
+
+    def __init__(self, path, backend=None):
+        self.path = path
+        self.backend = open_backend(path, backend or Config.DECODE_BACKEND)
+        self.frames = queue.Queue(maxsize=Config.DECODE_QUEUE_SIZE)
+        self.stopped = threading.Event()
+        self.position = 0
+        self.start()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._decode, daemon=True)
+        self.thread.start()
+
+    def _decode(self):
+        try:
+            while not self.stopped.is_set():
+                frame = self.backend.read()
+                if frame is None:
+                    break
+                if self.backend.color == 'rgb':
+                    pair = (cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), frame)
+                else:
+                    pair = (frame, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                self._put(pair)
+        except Exception as e:
+            print(f"Error decoding video: {e}")
+        finally:
+            self._put(None)
+
+    def _put(self, item):
+        # Blocks while the queue is full, but gives up once the reader has gone
+        while not self.stopped.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def __repr__(self):
+        return f"DecodedVideo({self.path!r}, backend={self.backend.name!r})"
+
+    def isOpened(self):
+        return True
+
+    def read_pair(self):
+        """(ret, bgr_frame, rgb_frame)"""
+        if self.stopped.is_set():
+            return False, None, None
+        pair = self.frames.get()
+        if pair is None:
+            self.stopped.set()
+            return False, None, None
+        self.position += 1
+        return True, pair[0], pair[1]
+
+    def read(self):
+        ret, frame, _ = self.read_pair()
+        return ret, frame
+
+    def set(self, prop, value):
+        """Seek with CAP_PROP_POS_FRAMES; frames before the target are never converted"""
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return False
+
+        # Stop the decode thread and drop what it read ahead of the old position
+        self.stopped.set()
+        self.thread.join()
+        while not self.frames.empty():
+            self.frames.get_nowait()
+
+        self.backend.seek(int(value))
+        self.position = int(value)
+        self.stopped.clear()
+        self.start()
+        return True
+
+    def get(self, prop):
+        values = {
+            cv2.CAP_PROP_POS_FRAMES: self.position,
+            cv2.CAP_PROP_FPS: self.backend.fps,
+            cv2.CAP_PROP_FRAME_WIDTH: self.backend.width,
+            cv2.CAP_PROP_FRAME_HEIGHT: self.backend.height,
+            cv2.CAP_PROP_FRAME_COUNT: self.backend.frame_count
+        }
+        return float(values.get(prop, 0.0))
+
+    def release(self):
+        self.stopped.set()
+        self.thread.join()
+        self.backend.close()
+
+def open_backend(path, name='auto'):
+    """Open a video with the named backend, or with the first one that works for 'auto'"""
+    if name != 'auto':
+        return BACKENDS[name](path)
+
+    errors = []
+    for name in Config.DECODE_BACKEND_ORDER:
+        try:
+            return BACKENDS[name](path)
+        except Exception as e:  # Not installed, or cannot read this file
+            errors.append(f"{name}: {e}")
+    raise IOError(f"No decode backend can open {path} ({'; '.join(errors)})")
+
+def main():
+    """Time every available backend on a video: python -m utils.decoders <video>"""
+    if len(sys.argv) < 2:
+        print("Usage: python -m utils.decoders <video>")
+        sys.exit(1)
+
+    for name in BACKENDS:
+        try:
+            video = DecodedVideo(sys.argv[1], name)
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+            continue
+
+        start_time = time.time()
+        frames = 0
+        while video.read_pair()[0]:
+            frames += 1
+        elapsed = time.time() - start_time
+        video.release()
+        print(f"✅ {name}: {frames} frames at {video.backend.width}x{video.backend.height}, "
+              f"{frames / max(elapsed, 1e-9):.1f} FPS")
+
+if __name__ == "__main__":
+    main()
@@ -1,180 +1,135 @@
 # utils/evaluator.py - COMPLETE FILE
 import numpy as np
 from statistics import mean, stdev
+from config.settings import Config
+from utils.biomechanics import METRIC_KEYS, metrics_to_array
+from utils.kinematics import PHASES, segment_phases
+from utils.rules import load_rules
+
+def robust_aggregate(values, weights, trim=None):
+    """Weighted trimmed mean of each row of values; NaN values carry no weight
+
+    `trim` is the share of each row's total weight cut from both ends of the
+    sorted values; 0.5 gives the weighted median. Rows with no weight are NaN.
+    """
+    trim = Config.AGGREGATE_TRIM if trim is None else trim
+    missing = np.isnan(values)
+    weights = np.where(missing, 0.0, weights)
+
+    order = np.argsort(np.where(missing, np.inf, values), axis=1)
+    values = np.take_along_axis(values, order, axis=1)
+    weights = np.take_along_axis(weights, order, axis=1)
+
+    upper = np.cumsum(weights, axis=1)
+    total = upper[:, -1:]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if trim >= 0.5:
+            median = np.argmax(upper >= total / 2, axis=1)
+            result = values[np.arange(len(values)), median]
+        else:
+            # Weight of each sample that falls inside the kept [trim, 1 - trim] share
+            kept = np.clip(np.minimum(upper, (1 - trim) * total) - np.maximum(upper - weights, trim * total), 0, None)
+            result = np.where(kept > 0, kept * values, 0.0).sum(axis=1) / kept.sum(axis=1)
+    return np.where(total[:, 0] > 0, result, np.nan)
 
 class ShotEvaluator:
-    def __init__(self):
-        pass
+    def __init__(self, shot_type=None, age_group=None):
+        # Thresholds, feedback and recommendations come from the scoring rules file
+        self.rulebook = load_rules()
+        self.shot_type = shot_type
+        self.age_group = age_group
+        # Fail early on an unknown shot type or age group
+        self.rulebook.get(shot_type, age_group)
+    
+    @property
+    def rules(self):
+        return self.rulebook.get(self.shot_type, self.age_group)
     
     def evaluate_shot(self, frame_metrics):
         """Evaluate the complete shot"""
+        rules = self.rules
         if not frame_metrics:
-            return self.get_default_evaluation()
+            return self.get_default_evaluation(rules)
         
-        # Calculate category scores
-        footwork_score = self.evaluate_footwork(frame_metrics)
-        head_position_score = self.evaluate_head_position(frame_metrics)
-        swing_control_score = self.evaluate_swing_control(frame_metrics)
-        balance_score = self.evaluate_balance(frame_metrics)
-        follow_through_score = self.evaluate_follow_through(frame_metrics)
+        # Locate the shot phases so each category is scored where it matters
+        phases = segment_phases(frame_metrics)
+        averages = self.aggregate(frame_metrics, phases, rules)
         
-        # Overall analysis
-        overall_score = mean([
-            footwork_score['score'],
-            head_position_score['score'],
-            swing_control_score['score'],
-            balance_score['score'],
-            follow_through_score['score']
-        ])
+        # Calculate category scores
+        scores = rules.evaluate(averages, len(frame_metrics))
+        overall_score = mean(category['score'] for category in scores.values())
         
         evaluation = {
             'overall_score': round(overall_score, 1),
             'total_frames_analyzed': len(frame_metrics),
-            'scores': {
-                'footwork': footwork_score,
-                'head_position': head_position_score,
-                'swing_control': swing_control_score,
-                'balance': balance_score,
-                'follow_through': follow_through_score
-            },
-            'recommendations': self.get_recommendations(frame_metrics)
-        }
-        
-        return evaluation
-    
-    def evaluate_footwork(self, frame_metrics):
-        """Evaluate footwork"""
-        foot_directions = [m['foot_direction'] for m in frame_metrics if m['foot_direction'] is not None]
-        
-        if not foot_directions:
-            return {'score': 5, 'feedback': 'Could not analyze foot direction'}
-        
-        avg_foot_angle = mean(foot_directions)
-        
-        if 45 <= avg_foot_angle <= 60:
-            score = 9
-        elif 35 <= avg_foot_angle <= 70:
-            score = 7
-        else:
-            score = 5
-        
-        return {
-            'score': score,
-            'feedback': f'Foot angle: {avg_foot_angle:.1f}°. ' + 
-                       ('Good positioning' if score >= 7 else 'Improve foot placement')
+            'scores': scores,
+            'recommendations': rules.recommendations(averages),
+            'rules': {'shot_type': rules.shot_type, 'age_group': rules.age_group}
         }
-    
-    def evaluate_head_position(self, frame_metrics):
-        """Evaluate head position"""
-        alignments = [m['head_knee_alignment'] for m in frame_metrics if m['head_knee_alignment'] is not None]
-        
-        if not alignments:
-            return {'score': 5, 'feedback': 'Could not analyze head position'}
         
-        avg_alignment = mean(alignments)
-        
-        if avg_alignment < 0.03:
-            score = 9
-        elif avg_alignment < 0.05:
-            score = 7
-        else:
-            score = 5
+        if phases:
+            evaluation['phases'] = self.describe_phases(frame_metrics, phases)
         
-        return {
-            'score': score,
-            'feedback': f'Head stability good' if score >= 7 else 'Keep head over front knee'
-        }
+        return evaluation
     
-    def evaluate_swing_control(self, frame_metrics):
-        """Evaluate swing control"""
-        elbow_angles = [m['elbow_angle'] for m in frame_metrics if m['elbow_angle'] is not None]
-        
-        if not elbow_angles:
-            return {'score': 5, 'feedback': 'Could not analyze swing mechanics'}
-        
-        avg_elbow = mean(elbow_angles)
-        
-        if 110 <= avg_elbow <= 140:
-            score = 9
-        elif 100 <= avg_elbow <= 150:
-            score = 7
-        else:
-            score = 5
-        
+    def aggregate(self, frame_metrics, phases, rules=None):
+        """Confidence-weighted, trimmed averages for every aggregate the rules use, in one pass"""
+        rules = rules or self.rules
+        values = metrics_to_array(frame_metrics)
+        confidence = metrics_to_array([m.get('confidence', {}) for m in frame_metrics])
+        
+        # Visibility at the detection cutoff counts for nothing; metrics without a confidence count fully
+        floor = Config.CONFIDENCE_FLOOR
+        weights = np.where(np.isnan(confidence), 1.0, np.clip((confidence - floor) / (1 - floor), 0, 1))
+        
+        columns = [METRIC_KEYS.index(metric) for metric, _, _ in rules.aggregates.values()]
+        n_frames = len(frame_metrics)
+        masks = [
+            # fallback_start: where to start when the phases were not found (follow-through: the last third)
+            self.phase_mask(n_frames, phases, names, int(n_frames * fallback_start))
+            for _, names, fallback_start in rules.aggregates.values()
+        ]
+        
+        results = robust_aggregate(values[:, columns].T, weights[:, columns].T * np.array(masks))
         return {
-            'score': score,
-            'feedback': f'Elbow positioning ' + ('excellent' if score >= 8 else 'needs work')
+            name: None if np.isnan(result) else float(result)
+            for name, result in zip(rules.aggregates, results)
         }
     
-    def evaluate_balance(self, frame_metrics):
-        """Evaluate balance"""
-        balance_scores = [m['balance_score'] for m in frame_metrics if m['balance_score'] is not None]
-        
-        if not balance_scores:
-            return {'score': 6, 'feedback': 'Balance analysis limited'}
-        
-        avg_balance = mean(balance_scores)
-        score = min(10, max(1, avg_balance * 10))
-        
-        return {
-            'score': round(score, 1),
-            'feedback': 'Good balance' if score >= 7 else 'Work on stability'
-        }
+    def phase_mask(self, n_frames, phases, names, fallback_start=0):
+        """Frames in the given phases; frames from fallback_start on when those phases are unknown or empty"""
+        mask = np.zeros(n_frames, dtype=bool)
+        if phases and names:
+            for name in names:
+                start, end = phases[name]
+                mask[start:end] = True
+        
+        if not mask.any():
+            mask[fallback_start:] = True
+        return mask
     
-    def evaluate_follow_through(self, frame_metrics):
-        """Evaluate follow-through"""
-        if len(frame_metrics) < 10:
-            return {'score': 6, 'feedback': 'Limited follow-through data'}
-        
-        last_third = frame_metrics[2*len(frame_metrics)//3:]
-        spine_leans = [m['spine_lean'] for m in last_third if m['spine_lean'] is not None]
-        
-        if spine_leans:
-            avg_lean = mean(spine_leans)
-            if 15 <= avg_lean <= 25:
-                score = 8
+    def describe_phases(self, frame_metrics, phases):
+        """Phase boundaries as video frame numbers"""
+        boundaries = {}
+        for name in PHASES:
+            start, end = phases[name]
+            if end > start:
+                boundaries[name] = [frame_metrics[start]['frame'], frame_metrics[end - 1]['frame']]
             else:
-                score = 6
-        else:
-            score = 5
+                boundaries[name] = None
         
         return {
-            'score': score,
-            'feedback': 'Good completion' if score >= 7 else 'Focus on follow-through'
+            'impact_frame': frame_metrics[phases['impact']]['frame'],
+            'boundaries': boundaries
         }
     
-    def get_recommendations(self, frame_metrics):
-        """Generate recommendations"""
-        recommendations = []
-        
-        elbow_angles = [m['elbow_angle'] for m in frame_metrics if m['elbow_angle'] is not None]
-        if elbow_angles and mean(elbow_angles) < 110:
-            recommendations.append("Work on getting the front elbow higher during the shot")
-        
-        alignments = [m['head_knee_alignment'] for m in frame_metrics if m['head_knee_alignment'] is not None]
-        if alignments and mean(alignments) > 0.05:
-            recommendations.append("Focus on keeping your head over the front knee")
-        
-        spine_leans = [m['spine_lean'] for m in frame_metrics if m['spine_lean'] is not None]
-        if spine_leans and mean(spine_leans) > 25:
-            recommendations.append("Try to maintain a more upright posture during the shot")
-        
-        if not recommendations:
-            recommendations.append("Overall technique looks good! Continue practicing for consistency")
-        
-        return recommendations
-    
-    def get_default_evaluation(self):
+    def get_default_evaluation(self, rules=None):
         """Default evaluation when no data"""
+        rules = rules or self.rules
         return {
             'overall_score': 0,
             'total_frames_analyzed': 0,
-            'scores': {
-                'footwork': {'score': 0, 'feedback': 'No data available'},
-                'head_position': {'score': 0, 'feedback': 'No data available'},
-                'swing_control': {'score': 0, 'feedback': 'No data available'},
-                'balance': {'score': 0, 'feedback': 'No data available'},
-                'follow_through': {'score': 0, 'feedback': 'No data available'}
-            },
-            'recommendations': ['Unable to analyze - ensure clear view of player']
+            'scores': {name: {'score': 0, 'feedback': 'No data available'} for name in rules.categories},
+            'recommendations': ['Unable to analyze - ensure clear view of player'],
+            'rules': {'shot_type': rules.shot_type, 'age_group': rules.age_group}
         }
@@ -0,0 +1,195 @@
+# utils/kinematics.py - Windowed kinematics and shot phases
+import math
+import numpy as np
+from config.settings import Config
+from utils.orientation import RIGHT_HANDED_JOINTS
+
+# Shot phases in order
+PHASES = ['stance', 'backlift', 'downswing', 'follow_through']
+
+class RingBuffer:
+    """Fixed-capacity buffer of timestamped arrays with O(1) append"""
+
+    def __init__(self, capacity, shape=()):
+        self.capacity = capacity
+        self.values = np.zeros((capacity,) + tuple(shape))
+        self.times = np.zeros(capacity)
+        self.count = 0
+        self.head = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+        self.head = 0
+
+    def append(self, value, timestamp):
+        self.values[self.head] = value
+        self.times[self.head] = timestamp
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def get(self, age):
+        """Value and timestamp `age` samples back (0 is the newest)"""
+        index = (self.head - 1 - age) % self.capacity
+        return self.values[index], self.times[index]
+
+class KinematicsTracker:
+    """Per-frame joint velocities and a streaming shot-phase estimate"""
+
+    def __init__(self):
+        window = Config.KINEMATICS_WINDOW
+        self.hands = RingBuffer(window, (2,))
+        self.forearm_angle = RingBuffer(window)
+        self.elbow_angle = RingBuffer(window)
+        self.joints = RIGHT_HANDED_JOINTS
+        self.reset()
+
+    def reset(self):
+        self.hands.clear()
+        self.forearm_angle.clear()
+        self.elbow_angle.clear()
+        self.phase = 'stance'
+        self.peak_speed = 0.0
+        self.peak_frame = None
+        self.impact_frame = None
+
+    @staticmethod
+    def rate(buffer, span=2):
+        """Finite-difference rate of change over the last `span` samples"""
+        if len(buffer) < 2:
+            return None
+        span = min(span, len(buffer) - 1)
+        newest, t1 = buffer.get(0)
+        oldest, t0 = buffer.get(span)
+        if t1 <= t0:
+            return None
+        return (newest - oldest) / (t1 - t0)
+
+    @staticmethod
+    def jerk(buffer):
+        """Third derivative from the last four samples by successive finite differences"""
+        if len(buffer) < 4:
+            return None
+        samples = [buffer.get(age) for age in range(3, -1, -1)]
+        times = np.array([t for _, t in samples])
+        positions = np.array([v for v, _ in samples])
+        if np.any(np.diff(times) <= 0):
+            return None
+
+        # Velocity -> acceleration -> jerk, each at the midpoints of the previous level
+        velocity = np.diff(positions, axis=0) / np.diff(times)[:, None]
+        velocity_times = (times[1:] + times[:-1]) / 2
+        acceleration = np.diff(velocity, axis=0) / np.diff(velocity_times)[:, None]
+        acceleration_times = (velocity_times[1:] + velocity_times[:-1]) / 2
+        return (acceleration[1] - acceleration[0]) / (acceleration_times[1] - acceleration_times[0])
+
+    def push(self, buffer, value, timestamp):
+        """Append a sample, dropping the window if tracking was lost for too long"""
+        if len(buffer) and timestamp - buffer.get(0)[1] > Config.KINEMATICS_MAX_GAP:
+            buffer.clear()
+        buffer.append(value, timestamp)
+
+    def update(self, landmarks_array, timestamp, frame_number, elbow_angle=None):
+        """Add one frame of landmarks and return its kinematic metrics"""
+        visible = landmarks_array[:, 3] > 0.5
+        hand_speed = None
+        hand_jerk = None
+        hand_height = None
+        hand_vertical_velocity = None
+        forearm_velocity = None
+        elbow_velocity = None
+
+        # Hands: midpoint of both wrists, i.e. the grip on the bat
+        if visible[15] and visible[16]:
+            hands = (landmarks_array[15, :2] + landmarks_array[16, :2]) / 2
+            hand_height = float(1.0 - hands[1])
+            self.push(self.hands, hands, timestamp)
+            velocity = self.rate(self.hands)
+            if velocity is not None:
+                hand_speed = float(np.linalg.norm(velocity))
+                hand_vertical_velocity = float(-velocity[1])
+            jerk = self.jerk(self.hands)
+            if jerk is not None:
+                hand_jerk = float(np.linalg.norm(jerk))
+
+        # Forearm segment angle (elbow -> wrist), unwrapped against the previous sample
+        elbow, wrist = self.joints['arm_elbow'], self.joints['arm_wrist']
+        if visible[elbow] and visible[wrist]:
+            forearm = landmarks_array[wrist, :2] - landmarks_array[elbow, :2]
+            angle = math.degrees(math.atan2(forearm[1], forearm[0]))
+            if len(self.forearm_angle):
+                previous = self.forearm_angle.get(0)[0]
+                angle = previous + (angle - previous + 180) % 360 - 180
+            self.push(self.forearm_angle, angle, timestamp)
+            forearm_velocity = self.rate(self.forearm_angle)
+
+        if elbow_angle is not None:
+            self.push(self.elbow_angle, elbow_angle, timestamp)
+            elbow_velocity = self.rate(self.elbow_angle)
+
+        if hand_speed is not None:
+            self.update_phase(hand_speed, hand_vertical_velocity, frame_number)
+
+        return {
+            'hand_speed': hand_speed,
+            'hand_jerk': hand_jerk,
+            'hand_height': hand_height,
+            'forearm_angular_velocity': None if forearm_velocity is None else float(forearm_velocity),
+            'elbow_angular_velocity': None if elbow_velocity is None else float(elbow_velocity),
+            'phase': self.phase
+        }
+
+    def update_phase(self, hand_speed, hand_vertical_velocity, frame_number):
+        """Advance the streaming phase state machine"""
+        if self.phase == 'stance':
+            if hand_speed > Config.SWING_START_SPEED:
+                self.phase = 'backlift' if hand_vertical_velocity > 0 else 'downswing'
+
+        if self.phase == 'backlift' and hand_vertical_velocity < 0:
+            self.phase = 'downswing'
+
+        if self.phase == 'downswing':
+            if hand_speed > self.peak_speed:
+                self.peak_speed = hand_speed
+                self.peak_frame = frame_number
+            elif hand_speed < Config.IMPACT_SPEED_DROP * self.peak_speed:
+                # Hands are fastest around bat-ball contact
+                self.phase = 'follow_through'
+                self.impact_frame = self.peak_frame
+
+def segment_phases(frame_metrics):
+    """Phase boundaries for a whole shot as {phase: (start, end)} indices into frame_metrics
+
+    Unlike the streaming estimate, this sees the whole clip: impact is the
+    frame of peak hand speed and the top of the backlift is the highest
+    hand position between the start of the swing and impact.
+    """
+    speeds = np.array([
+        m['hand_speed'] if m.get('hand_speed') is not None else np.nan for m in frame_metrics
+    ])
+    if len(speeds) < Config.MIN_PHASE_FRAMES or not np.isfinite(speeds).any():
+        return None
+
+    impact = int(np.nanargmax(speeds))
+    if speeds[impact] < Config.SWING_START_SPEED:
+        return None
+
+    # The swing starts after the last slow frame before impact
+    slow = np.where(speeds[:impact] < Config.SWING_START_SPEED)[0]
+    swing_start = int(slow[-1]) + 1 if len(slow) else 0
+
+    heights = np.array([
+        m['hand_height'] if m.get('hand_height') is not None else np.nan
+        for m in frame_metrics[swing_start:impact + 1]
+    ])
+    top = swing_start + int(np.nanargmax(heights)) if np.isfinite(heights).any() else swing_start
+
+    return {
+        'stance': (0, swing_start),
+        'backlift': (swing_start, top),
+        'downswing': (top, impact + 1),
+        'follow_through': (impact + 1, len(frame_metrics)),
+        'impact': impact
+    }
@@ -0,0 +1,121 @@
+# utils/landmark_filter.py - Temporal landmark smoothing
+import math
+import numpy as np
+from config.settings import Config
+from utils.pose_detector import array_to_landmarks
+
+class OneEuroFilter:
+    """One-Euro filter applied element-wise to an array of any shape"""
+
+    def __init__(self, min_cutoff=None, beta=None, d_cutoff=None):
+        self.min_cutoff = Config.FILTER_MIN_CUTOFF if min_cutoff is None else min_cutoff
+        self.beta = Config.FILTER_BETA if beta is None else beta
+        self.d_cutoff = Config.FILTER_D_CUTOFF if d_cutoff is None else d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.prev_value = None
+        self.prev_speed = None
+        self.prev_timestamp = None
+
+    @staticmethod
+    def alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, value, timestamp):
+        if self.prev_value is None:
+            self.prev_value = value.copy()
+            self.prev_speed = np.zeros_like(value)
+            self.prev_timestamp = timestamp
+            return value.copy()
+
+        dt = abs(timestamp - self.prev_timestamp) or 1e-3
+
+        speed = (value - self.prev_value) / dt
+        a_d = self.alpha(self.d_cutoff, dt)
+        speed = self.prev_speed + a_d * (speed - self.prev_speed)
+
+        # Faster landmarks get a higher cutoff: less lag while moving, less jitter at rest
+        cutoff = self.min_cutoff + self.beta * np.abs(speed)
+        a = self.alpha(cutoff, dt)
+        filtered = self.prev_value + a * (value - self.prev_value)
+
+        self.prev_value = filtered
+        self.prev_speed = speed
+        self.prev_timestamp = timestamp
+        return filtered
+
+class LandmarkSmoother:
+    """Filtering stage between PoseDetector.detect and BiomechanicsAnalyzer.analyze_frame"""
+
+    def __init__(self):
+        self.filter = OneEuroFilter()
+        self.world_filter = OneEuroFilter()
+
+    def reset(self):
+        self.filter.reset()
+        self.world_filter.reset()
+
+    def apply(self, pose_results, timestamp):
+        """Smooth x, y, z of all landmarks in place (streaming variant)"""
+        array = pose_results['landmarks_array'].copy()
+        array[:, :3] = self.filter(array[:, :3], timestamp)
+
+        world = None
+        if 'world_landmarks_array' in pose_results:
+            world = pose_results['world_landmarks_array'].copy()
+            world[:, :3] = self.world_filter(world[:, :3], timestamp)
+
+        return self.store(pose_results, array, world)
+
+    def apply_sequence(self, detections, timestamps):
+        """Smooth the pose results of a whole clip in place (offline, zero-phase variant)"""
+        if not detections:
+            return detections
+        arrays = self.smooth_sequence([p['landmarks_array'] for p in detections], timestamps)
+        worlds = [None] * len(detections)
+        if all('world_landmarks_array' in p for p in detections):
+            worlds = self.smooth_sequence([p['world_landmarks_array'] for p in detections], timestamps)
+
+        for pose_results, array, world in zip(detections, arrays, worlds):
+            self.store(pose_results, array, world)
+        return detections
+
+    @staticmethod
+    def smooth_sequence(arrays, timestamps):
+        """Zero-phase smoothing of a (frames, 33, 4) landmark sequence
+
+        Runs the filter forward and then backward over the forward output, so the
+        lag of the two passes cancels out.
+        """
+        arrays = np.asarray(arrays, dtype=float)
+        smoothed = arrays.copy()
+        if len(arrays) == 0:
+            return smoothed
+
+        forward = OneEuroFilter()
+        for i, timestamp in enumerate(timestamps):
+            smoothed[i, :, :3] = forward(arrays[i, :, :3], timestamp)
+
+        backward = OneEuroFilter()
+        for i in range(len(arrays) - 1, -1, -1):
+            smoothed[i, :, :3] = backward(smoothed[i, :, :3], timestamps[i])
+
+        return smoothed
+
+    @staticmethod
+    def store(pose_results, array, world=None):
+        pose_results['landmarks_array'] = array
+        pose_results['landmarks'] = array_to_landmarks(array)
+        if world is not None:
+            pose_results['world_landmarks_array'] = world
+
+        # Keep the drawn skeleton in step with the analyzed one
+        pose_landmarks = pose_results.get('pose_landmarks')
+        if pose_landmarks is not None:
+            for landmark, (x, y, z, _) in zip(pose_landmarks.landmark, array):
+                landmark.x, landmark.y, landmark.z = x, y, z
+
+        return pose_results
+
@@ -0,0 +1,41 @@
+# utils/lazy_import.py - Deferred imports of heavy modules and an import-time budget check
+import importlib
+import subprocess
+import sys
+import types
+from config.settings import Config
+
+class LazyModule(types.ModuleType):
+    """Stands in for a module and imports it on first attribute access"""
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        # Later lookups find the attributes directly and skip __getattr__
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+def lazy_import(name):
+    """Module `name` if already imported, otherwise a LazyModule for it"""
+    return sys.modules.get(name) or LazyModule(name)
+
+def measure_import_time(module=None):
+    """Seconds a fresh interpreter takes to import a module"""
+    module = module or Config.IMPORT_TIME_MODULE
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main():
+    """Fail when the analysis entry module imports slower than the configured budget"""
+    module = sys.argv[1] if len(sys.argv) > 1 else Config.IMPORT_TIME_MODULE
+    # Best of a few runs, so a cold disk cache does not count against the budget
+    seconds = min(measure_import_time(module) for _ in range(3))
+    budget = Config.IMPORT_TIME_BUDGET
+
+    status = "✅" if seconds <= budget else "❌"
+    print(f"{status} import {module}: {seconds * 1000:.0f} ms (budget {budget * 1000:.0f} ms)")
+    if seconds > budget:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
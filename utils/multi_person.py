@@ -0,0 +1,306 @@
+# utils/multi_person.py - Multi-person detection, tracking and per-track analysis
+import numpy as np
+from config.settings import Config
+from utils.pose_detector import PoseDetector, array_to_landmarks
+from utils.biomechanics import BiomechanicsAnalyzer
+from utils.landmark_filter import LandmarkSmoother
+from utils.orientation import detect_orientation
+from utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+def box_iou(boxes_a, boxes_b):
+    """IoU matrix between two lists of (x0, y0, x1, y1) boxes"""
+    a = np.asarray(boxes_a, dtype=float).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=float).reshape(-1, 4)
+
+    x0 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y0 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x1 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y1 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-9)
+
+def box_containment(inner_boxes, outer_boxes):
+    """Matrix of the fraction of each inner box's area that lies inside each outer box"""
+    a = np.asarray(inner_boxes, dtype=float).reshape(-1, 4)
+    b = np.asarray(outer_boxes, dtype=float).reshape(-1, 4)
+
+    x0 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y0 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x1 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y1 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+
+    area = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    return intersection / np.maximum(area[:, None], 1e-9)
+
+class PersonDetector:
+    """Cheap person boxes from OpenCV's HOG people detector on a downscaled frame"""
+
+    def __init__(self):
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    def detect(self, frame):
+        height, width = frame.shape[:2]
+        scale = min(1.0, Config.PERSON_DETECT_WIDTH / width)
+        small = cv2.resize(frame, None, fx=scale, fy=scale) if scale < 1.0 else frame
+
+        rects, weights = self.hog.detectMultiScale(small, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        if len(rects) == 0:
+            return []
+
+        weights = np.asarray(weights, dtype=float).reshape(-1)
+        keep = cv2.dnn.NMSBoxes(
+            [list(map(int, r)) for r in rects], weights.tolist(),
+            Config.PERSON_DETECT_MIN_SCORE, Config.PERSON_NMS_IOU
+        )
+        return [
+            (x / scale, y / scale, (x + w) / scale, (y + h) / scale)
+            for x, y, w, h in (rects[i] for i in np.asarray(keep).reshape(-1))
+        ]
+
+class Track:
+    """One person: a crop box, its own pose graph and its own analysis state"""
+
+    def __init__(self, box, pose_detector, search=False):
+        # Assigned on the first pose, so detector false positives never use up an ID
+        self.id = None
+        self.box = box
+        # A search track scans the whole frame until it finds someone
+        self.search = search
+        self.missed = 0
+        self.hits = 0
+        self.pose_detector = pose_detector
+        self.biomechanics = BiomechanicsAnalyzer()
+        self.landmark_smoother = LandmarkSmoother()
+        self.frame_metrics = []
+        self.latest_metrics = None
+        self.orientation = None
+        # Detections held back until this person's orientation is known
+        self.pending = []
+
+    def crop_region(self, width, height):
+        """Square crop around the box; the pose model expects a square, not too small, input"""
+        x0, y0, x1, y1 = self.box
+        side = max(x1 - x0, y1 - y0) * (1 + 2 * Config.TRACK_CROP_MARGIN)
+        side = max(side, Config.TRACK_MIN_CROP * min(width, height))
+        center_x, center_y = (x0 + x1) / 2, (y0 + y1) / 2
+        return (
+            int(max(0, center_x - side / 2)), int(max(0, center_y - side / 2)),
+            int(min(width, center_x + side / 2)), int(min(height, center_y + side / 2))
+        )
+
+    def detect(self, rgb_frame):
+        """Run pose on this track's crop and map the landmarks back to full-frame coordinates"""
+        height, width = rgb_frame.shape[:2]
+        x0, y0, x1, y1 = self.crop_region(width, height)
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            self.missed += 1
+            return None
+
+        pose_results = self.pose_detector.detect_rgb(np.ascontiguousarray(rgb_frame[y0:y1, x0:x1]))
+        if not pose_results:
+            self.missed += 1
+            return None
+        self.missed = 0
+        self.hits += 1
+        self.search = False
+
+        crop_w, crop_h = x1 - x0, y1 - y0
+        array = pose_results['landmarks_array'].copy()
+        array[:, 0] = (x0 + array[:, 0] * crop_w) / width
+        array[:, 1] = (y0 + array[:, 1] * crop_h) / height
+        array[:, 2] = array[:, 2] * crop_w / width
+        pose_results['landmarks_array'] = array
+        pose_results['landmarks'] = array_to_landmarks(array)
+        for landmark, (x, y, z, _) in zip(pose_results['pose_landmarks'].landmark, array):
+            landmark.x, landmark.y, landmark.z = x, y, z
+
+        # Follow the person between person-detector runs; all 33 landmarks are
+        # predicted even when occluded, so their extent covers the whole body
+        self.box = (
+            max(0.0, array[:, 0].min() * width), max(0.0, array[:, 1].min() * height),
+            min(float(width), array[:, 0].max() * width), min(float(height), array[:, 1].max() * height)
+        )
+        return pose_results
+
+    def analyze(self, frame_count, pose_results, fps, aspect_ratio):
+        """Queue a detection and analyze everything that can be analyzed"""
+        self.pending.append((frame_count, pose_results))
+        if self.orientation is None and len(self.pending) >= Config.ORIENTATION_FRAMES:
+            self.set_orientation(aspect_ratio)
+        if self.orientation is not None:
+            self.flush(fps)
+
+    def set_orientation(self, aspect_ratio):
+        self.orientation = detect_orientation([p['landmarks_array'] for _, p in self.pending], aspect_ratio)
+        self.biomechanics.set_orientation(self.orientation)
+
+    def flush(self, fps):
+        for frame_count, pose_results in self.pending:
+            if Config.SMOOTH_LANDMARKS:
+                pose_results = self.landmark_smoother.apply(pose_results, frame_count / fps)
+            self.latest_metrics = self.biomechanics.analyze_frame(pose_results, frame_count, fps)
+            self.frame_metrics.append(self.latest_metrics)
+        self.pending = []
+
+class MultiPersonAnalyzer:
+    """Tracks several people with stable IDs and keeps analysis state per track"""
+
+    def __init__(self, video_processor):
+        self.video_processor = video_processor
+        self.person_detector = PersonDetector()
+        # Pose graphs not in use by a track; built ahead of the video by warm_up()
+        self.idle_detectors = []
+        self.tracks = []
+        self.reset()
+
+    def reset(self):
+        for track in self.tracks:
+            self.release(track)
+        self.tracks = []
+        self.finished_tracks = []
+        self.next_id = 1
+
+    def warm_up(self):
+        """Build and warm a pose graph for every possible track, so none is built mid-video
+
+        Raises if the pose model cannot be loaded (e.g. it must be downloaded and
+        there is no network) instead of failing on every frame.
+        """
+        while len(self.idle_detectors) + len(self.tracks) < Config.MAX_TRACKS:
+            detector = PoseDetector(model_complexity=Config.MULTI_PERSON_MODEL_COMPLEXITY)
+            detector.warm_up()
+            self.idle_detectors.append(detector)
+
+    def release(self, track):
+        """Return a track's pose graph to the pool; a blank frame clears its tracking state"""
+        if track.pose_detector is not None:
+            track.pose_detector.warm_up()
+            self.idle_detectors.append(track.pose_detector)
+            track.pose_detector = None
+
+    def associate(self, boxes, width, height):
+        """Match detected boxes to tracks; start tracks for new people"""
+        unmatched = list(range(len(boxes)))
+        if self.tracks and boxes:
+            track_boxes = [t.box for t in self.tracks]
+            # A track's box is the tight landmark extent, a detector box pads the person,
+            # so a detection around the whole track matches as well as one that overlaps it
+            score = np.maximum(box_iou(track_boxes, boxes), box_containment(track_boxes, boxes))
+            matched = set()
+            for flat in np.argsort(score, axis=None)[::-1]:
+                t, b = np.unravel_index(flat, score.shape)
+                if score[t, b] < Config.TRACK_IOU_THRESHOLD:
+                    break
+                if t in matched or b not in unmatched:
+                    continue
+                self.tracks[t].box = boxes[b]
+                matched.add(t)
+                unmatched.remove(b)
+
+        tracked = [t.box for t in self.tracks if not t.search]
+        for b in unmatched:
+            # A box mostly inside a tracked person is a limb or a false positive,
+            # one mostly around a tracked person is that person again
+            if tracked and max(
+                box_containment([boxes[b]], tracked).max(), box_containment(tracked, [boxes[b]]).max()
+            ) > Config.TRACK_DUPLICATE_IOU:
+                continue
+            self.add_track(boxes[b])
+
+        # While nobody is being followed, search the whole frame as well; a confirmed
+        # track that misses a few frames is still followed, and searching would find it twice
+        if not any(t.hits or t.search for t in self.tracks):
+            self.add_track((0, 0, width, height), search=True)
+
+    def add_track(self, box, search=False):
+        if len(self.tracks) < Config.MAX_TRACKS:
+            if self.idle_detectors:
+                detector = self.idle_detectors.pop()
+            else:
+                detector = PoseDetector(model_complexity=Config.MULTI_PERSON_MODEL_COMPLEXITY)
+            self.tracks.append(Track(box, detector, search))
+
+    def prune(self):
+        """Drop lost tracks and tracks that have converged on the same person"""
+        kept = []
+        live = any(t.hits and not t.missed for t in self.tracks)
+        # Established tracks first, so the one with more hits survives a merge
+        for track in sorted(self.tracks, key=lambda t: -t.hits):
+            duplicate = False
+            if track.search:
+                lost = live
+            else:
+                max_missed = Config.TRACK_MAX_MISSED if track.hits else Config.TRACK_TENTATIVE_FRAMES
+                lost = track.missed > max_missed
+                duplicate = any(
+                    box_iou([track.box], [other.box])[0, 0] > Config.TRACK_DUPLICATE_IOU
+                    for other in kept if not other.search
+                )
+            if lost or duplicate:
+                self.release(track)
+                # A duplicate's frames are the surviving track's person, not someone else
+                if track.hits and not duplicate:
+                    self.finished_tracks.append(track)
+            else:
+                kept.append(track)
+        self.tracks = [t for t in self.tracks if t in kept]
+
+    def process_frame(self, frame, frame_count, fps, rgb_frame=None):
+        """Detect, track, analyze and annotate every person in a frame"""
+        height, width = frame.shape[:2]
+        if frame_count % Config.PERSON_DETECT_INTERVAL == 1 or not self.tracks:
+            self.associate(self.person_detector.detect(frame), width, height)
+        else:
+            self.associate([], width, height)
+
+        # One color conversion shared by every crop (unless the decoder already made one)
+        if rgb_frame is None:
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+        detections = []
+        for track in self.tracks:
+            pose_results = track.detect(rgb_frame)
+            if pose_results:
+                if track.id is None:
+                    track.id = self.next_id
+                    self.next_id += 1
+                track.analyze(frame_count, pose_results, fps, width / height)
+                detections.append((track, pose_results))
+        self.prune()
+
+        primary = self.primary_track()
+        for track, pose_results in detections:
+            frame = self.video_processor.pose_detector.draw_landmarks(frame, pose_results['pose_landmarks'])
+            frame = self.video_processor.add_track_label(frame, track.id, track.box, track is primary)
+        if primary is not None and primary.latest_metrics is not None:
+            frame = self.video_processor.add_metrics_overlay(frame, primary.latest_metrics)
+        if not detections:
+            frame = self.video_processor.add_no_detection_overlay(frame)
+
+        return self.video_processor.add_frame_info(frame, frame_count)
+
+    def all_tracks(self):
+        return self.finished_tracks + self.tracks
+
+    def primary_track(self):
+        """The person analyzed longest, taken to be the batter"""
+        tracks = [t for t in self.all_tracks() if t.frame_metrics or t.pending]
+        if not tracks:
+            return None
+        return max(tracks, key=lambda t: len(t.frame_metrics) + len(t.pending))
+
+    def finish(self, fps, aspect_ratio):
+        """Analyze detections still waiting on an orientation"""
+        for track in self.all_tracks():
+            if track.pending:
+                if track.orientation is None:
+                    track.set_orientation(aspect_ratio)
+                track.flush(fps)
@@ -0,0 +1,75 @@
+# utils/orientation.py - Batter handedness and camera view detection
+import numpy as np
+from config.settings import Config
+
+# Landmark indices for each joint role, for a right-handed batter
+RIGHT_HANDED_JOINTS = {
+    'arm_shoulder': 12,
+    'arm_elbow': 14,
+    'arm_wrist': 16,
+    'front_knee': 25,
+    'front_ankle': 27
+}
+
+def mirror_landmark(index):
+    """Index of the same landmark on the other side of the body"""
+    if index >= 11:
+        return index + 1 if index % 2 else index - 1
+    return {1: 4, 2: 5, 3: 6, 4: 1, 5: 2, 6: 3, 7: 8, 8: 7, 9: 10, 10: 9}.get(index, index)
+
+LEFT_HANDED_JOINTS = {role: mirror_landmark(index) for role, index in RIGHT_HANDED_JOINTS.items()}
+
+DEFAULT_ORIENTATION = {
+    'handedness': 'right',
+    'view': 'side_on',
+    'facing': 1,
+    'joints': RIGHT_HANDED_JOINTS
+}
+
+def detect_orientation(landmark_arrays, aspect_ratio=16 / 9):
+    """Infer batter handedness and camera view from a batch of (33, 4) landmark arrays
+
+    aspect_ratio is the frame's width / height, so that normalized x and y
+    distances can be compared.
+    """
+    if len(landmark_arrays) == 0:
+        return dict(DEFAULT_ORIENTATION)
+
+    arrays = np.asarray(landmark_arrays, dtype=float)
+    x = arrays[..., 0] * aspect_ratio
+    y = arrays[..., 1]
+    z = arrays[..., 2]
+    visible = arrays[..., 3] > 0.5
+
+    torso = visible[:, [11, 12, 23, 24]].all(axis=1)
+    legs = visible[:, [25, 26, 27, 28]].all(axis=1)
+    if not torso.any():
+        return dict(DEFAULT_ORIENTATION)
+
+    # Side-on, the shoulders overlap; front-on, they are nearly a torso length apart
+    shoulder_width = np.abs(x[:, 11] - x[:, 12])
+    torso_length = np.abs((y[:, 11] + y[:, 12]) / 2 - (y[:, 23] + y[:, 24]) / 2)
+    ratio = np.median(shoulder_width[torso] / np.maximum(torso_length[torso], 1e-6))
+    view = 'front_on' if ratio > Config.FRONT_ON_SHOULDER_RATIO else 'side_on'
+
+    # Side-on, forward is the way the nose points relative to the shoulders (+1 is +x)
+    facing = 1
+    if view == 'side_on':
+        facing = -1 if np.median(x[torso, 0] - (x[torso, 11] + x[torso, 12]) / 2) < 0 else 1
+
+    # A right-handed batter has the left foot forward
+    left_front = True
+    if legs.any():
+        if view == 'side_on':
+            left_front = np.median((x[legs, 27] - x[legs, 28]) * facing) >= 0
+        else:
+            # Front-on, the front foot is the one nearer the camera
+            left_front = np.median(z[legs, 27] - z[legs, 28]) <= 0
+
+    handedness = 'right' if left_front else 'left'
+    return {
+        'handedness': handedness,
+        'view': view,
+        'facing': facing,
+        'joints': RIGHT_HANDED_JOINTS if handedness == 'right' else LEFT_HANDED_JOINTS
+    }
@@ -1,26 +1,69 @@
 # utils/pose_detector.py - COMPLETE FILE
-import cv2
-import mediapipe as mp
 import numpy as np
+from config.settings import Config
+from utils.lazy_import import lazy_import
+
+# Importing mediapipe takes over a second; only pay for it when poses are needed
+cv2 = lazy_import('cv2')
+mp = lazy_import('mediapipe')
+
+def landmarks_to_array(landmarks):
+    """Convert landmark dicts to a compact (33, 4) array of x, y, z, visibility"""
+    return np.array([[lm['x'], lm['y'], lm['z'], lm['visibility']] for lm in landmarks])
+
+def array_to_landmarks(array):
+    """Convert a (33, 4) landmark array back to landmark dicts"""
+    return [
+        {'x': float(x), 'y': float(y), 'z': float(z), 'visibility': float(visibility)}
+        for x, y, z, visibility in array
+    ]
 
 class PoseDetector:
-    def __init__(self):
-        self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=False,
-            model_complexity=1,  # Balance between speed and accuracy
-            enable_segmentation=False,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
-        self.mp_drawing = mp.solutions.drawing_utils
+    def __init__(self, world_landmarks=None, model_complexity=1):
+        # Also return metric 3D landmarks (meters, origin between the hips)
+        self.world_landmarks = Config.USE_WORLD_LANDMARKS if world_landmarks is None else world_landmarks
+        self.model_complexity = model_complexity  # 1 balances speed and accuracy
+        self._pose = None
+    
+    @property
+    def mp_pose(self):
+        return mp.solutions.pose
+    
+    @property
+    def mp_drawing(self):
+        return mp.solutions.drawing_utils
+    
+    @property
+    def pose(self):
+        """Pose graph, built on first use (detectors that only draw never build one)"""
+        if self._pose is None:
+            self._pose = self.mp_pose.Pose(
+                static_image_mode=False,
+                model_complexity=self.model_complexity,
+                enable_segmentation=False,
+                min_detection_confidence=0.5,
+                min_tracking_confidence=0.5
+            )
+        return self._pose
+    
+    def warm_up(self):
+        """Build the graph and run one blank frame through it, so the first real frame is fast"""
+        self.pose.process(np.zeros((256, 256, 3), dtype=np.uint8))
         
     def detect(self, frame):
         """Detect pose landmarks in frame"""
         try:
             # Convert BGR to RGB
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
+        except Exception as e:
+            print(f"Pose detection error: {e}")
+            return None
+        
+        return self.detect_rgb(rgb_frame)
+    
+    def detect_rgb(self, rgb_frame):
+        """Detect pose landmarks in an already converted RGB frame"""
+        try:
             # Process frame
             results = self.pose.process(rgb_frame)
             
@@ -35,10 +78,18 @@ class PoseDetector:
                         'visibility': landmark.visibility
                     })
                 
-                return {
+                detection = {
                     'landmarks': landmarks,
+                    'landmarks_array': landmarks_to_array(landmarks),
                     'pose_landmarks': results.pose_landmarks
                 }
+                
+                if self.world_landmarks and results.pose_world_landmarks:
+                    detection['world_landmarks_array'] = np.array([
+                        [lm.x, lm.y, lm.z, lm.visibility] for lm in results.pose_world_landmarks.landmark
+                    ])
+                
+                return detection
             
             return None
             
@@ -0,0 +1,278 @@
+# utils/reference_comparison.py - Reference shot comparison
+import json
+import os
+import sys
+import numpy as np
+from config.settings import Config
+from utils.biomechanics import METRIC_KEYS, metrics_to_array
+from utils.kinematics import PHASES
+
+# Default shot phases as fractions of the (time-normalized) shot, used when
+# the query's phases could not be segmented
+DEFAULT_PHASES = [
+    ('stance', 0.0, 0.3),
+    ('backlift', 0.3, 0.5),
+    ('downswing', 0.5, 0.7),
+    ('follow_through', 0.7, 1.0)
+]
+
+# Reference clips analyzed directly (offline, with zero-phase landmark smoothing)
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm')
+
+def resample_series(series, length):
+    """Interpolate missing values and resample a (frames, metrics) array to a fixed length"""
+    frames, n_metrics = series.shape
+    resampled = np.full((length, n_metrics), np.nan)
+    if frames == 0:
+        return resampled
+
+    source_t = np.linspace(0.0, 1.0, frames)
+    target_t = np.linspace(0.0, 1.0, length)
+    for col in range(n_metrics):
+        valid = np.isfinite(series[:, col])
+        if valid.sum() >= 2:
+            resampled[:, col] = np.interp(target_t, source_t[valid], series[valid, col])
+        elif valid.any():
+            resampled[:, col] = series[valid, col][0]
+    return resampled
+
+class ReferenceLibrary:
+    def __init__(self, length=None, band_ratio=None):
+        self.length = length or Config.REFERENCE_SERIES_LENGTH
+        band_ratio = Config.DTW_BAND_RATIO if band_ratio is None else band_ratio
+        self.band = max(1, int(round(self.length * band_ratio)))
+
+        self.names = []
+        self.series = np.empty((0, self.length, len(METRIC_KEYS)))
+
+        # Index built from the raw series (see _build_index)
+        self.scale = np.ones(len(METRIC_KEYS))
+        self.normalized = self.series
+        self.upper = self.series
+        self.lower = self.series
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, frame_metrics, rebuild=True):
+        """Add a reference shot from its per-frame metrics"""
+        series = resample_series(metrics_to_array(frame_metrics), self.length)
+
+        missing = [key for key, col in zip(METRIC_KEYS, series.T) if not np.isfinite(col).all()]
+        if missing:
+            raise ValueError(f"Reference '{name}' is missing metrics: {', '.join(missing)}")
+
+        self.names.append(name)
+        self.series = np.concatenate([self.series, series[np.newaxis]])
+
+        if rebuild:
+            self._build_index()
+
+    def _build_index(self):
+        """Precompute normalized series and Sakoe-Chiba envelopes for LB_Keogh pruning"""
+        if not self.names:
+            return
+
+        scale = self.series.reshape(-1, len(METRIC_KEYS)).std(axis=0)
+        self.scale = np.where(scale > 1e-9, scale, 1.0)
+        self.normalized = self.series / self.scale
+
+        # Running max/min over each reference within the band
+        self.upper = self.normalized.copy()
+        self.lower = self.normalized.copy()
+        for offset in range(1, self.band + 1):
+            self.upper[:, offset:] = np.maximum(self.upper[:, offset:], self.normalized[:, :-offset])
+            self.upper[:, :-offset] = np.maximum(self.upper[:, :-offset], self.normalized[:, offset:])
+            self.lower[:, offset:] = np.minimum(self.lower[:, offset:], self.normalized[:, :-offset])
+            self.lower[:, :-offset] = np.minimum(self.lower[:, :-offset], self.normalized[:, offset:])
+
+    def save(self, path):
+        """Save the precomputed library to an .npz file"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(path, names=np.array(self.names), series=self.series,
+                 length=self.length, band=self.band)
+
+    @classmethod
+    def load(cls, path):
+        """Load a library saved with save()"""
+        data = np.load(path)
+        library = cls(length=int(data['length']))
+        library.band = int(data['band'])
+        library.names = [str(name) for name in data['names']]
+        library.series = data['series']
+        library._build_index()
+        return library
+
+    @classmethod
+    def from_directory(cls, directory, **kwargs):
+        """Build a library from JSON files holding a list of per-frame metrics, and from video clips"""
+        library = cls(**kwargs)
+        analyzer = None
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            if filename.lower().endswith(VIDEO_EXTENSIONS):
+                if analyzer is None:
+                    from cover_drive_analysis_realtime import CoverDriveAnalyzer
+                    analyzer = CoverDriveAnalyzer()
+                frame_metrics = analyzer.extract_metrics(path)
+            elif filename.endswith('.json'):
+                with open(path) as f:
+                    data = json.load(f)
+                frame_metrics = data['frame_metrics'] if isinstance(data, dict) else data
+            else:
+                continue
+            library.add(os.path.splitext(filename)[0], frame_metrics, rebuild=False)
+        library._build_index()
+        return library
+
+    def lower_bounds(self, query):
+        """LB_Keogh lower bound of the banded DTW distance to every reference"""
+        above = np.where(query > self.upper, query - self.upper, 0.0)
+        below = np.where(query < self.lower, self.lower - query, 0.0)
+        excess = np.nan_to_num(above + below)
+        return (excess ** 2).sum(axis=(1, 2))
+
+    def _band_costs(self, query, refs):
+        """Squared distances between query[i] and refs[:, i + k] for every band offset k"""
+        n_refs = refs.shape[0]
+        costs = np.full((n_refs, self.length, 2 * self.band + 1), np.inf)
+        for k in range(-self.band, self.band + 1):
+            rows = slice(max(0, -k), self.length - max(0, k))
+            cols = slice(max(0, k), self.length - max(0, -k))
+            diff = query[np.newaxis, rows] - refs[:, cols]
+            costs[:, rows, k + self.band] = np.nan_to_num(diff ** 2).sum(axis=2)
+        return costs
+
+    def _dtw(self, query, refs):
+        """Banded DTW over a batch of references; returns the accumulated cost table"""
+        costs = self._band_costs(query, refs)
+        width = costs.shape[2]
+        acc = np.full_like(costs, np.inf)
+
+        acc[:, 0, self.band] = costs[:, 0, self.band]
+        for k in range(self.band + 1, width):
+            acc[:, 0, k] = costs[:, 0, k] + acc[:, 0, k - 1]
+
+        for i in range(1, self.length):
+            prev = acc[:, i - 1]
+            # Diagonal step keeps k, vertical step comes from k + 1 on the previous row
+            step = prev.copy()
+            step[:, :-1] = np.minimum(step[:, :-1], prev[:, 1:])
+            row = costs[:, i] + step
+            # Horizontal step comes from k - 1 on the same row
+            for k in range(1, width):
+                row[:, k] = np.minimum(row[:, k], costs[:, i, k] + row[:, k - 1])
+            acc[:, i] = row
+        return acc
+
+    def _warping_path(self, acc):
+        """Backtrack the optimal path through a single accumulated cost table"""
+        i, k = self.length - 1, self.band
+        path = [(i, i)]
+        while i > 0 or k != self.band:
+            candidates = []
+            if i > 0:
+                candidates.append((acc[i - 1, k], i - 1, k))
+                if k + 1 < acc.shape[1]:
+                    candidates.append((acc[i - 1, k + 1], i - 1, k + 1))
+            if k > 0 and i + k - self.band > 0:
+                candidates.append((acc[i, k - 1], i, k - 1))
+            _, i, k = min(candidates)
+            path.append((i, i + k - self.band))
+        return path[::-1]
+
+    @staticmethod
+    def phase_fractions(n_frames, phases):
+        """Convert segmented phase index ranges to fractions of the shot"""
+        if not phases or n_frames < 2:
+            return DEFAULT_PHASES
+        last = n_frames - 1
+        return [
+            (name, phases[name][0] / last, 1.0 if phases[name][1] >= n_frames else phases[name][1] / last)
+            for name in PHASES
+        ]
+
+    def phase_deviations(self, query, reference, path, phase_fractions=DEFAULT_PHASES):
+        """Mean signed deviation (query - reference) per metric for each phase"""
+        path = np.array(path)
+        diffs = query[path[:, 0]] - reference[path[:, 1]]
+        position = path[:, 0] / (self.length - 1)
+
+        deviations = {}
+        for phase, start, end in phase_fractions:
+            in_phase = (position >= start) & ((position < end) | (end >= 1.0))
+            phase_diffs = diffs[in_phase]
+            if len(phase_diffs) == 0:
+                continue
+            deviations[phase] = {
+                key: round(float(np.nanmean(phase_diffs[:, col])), 3)
+                for col, key in enumerate(METRIC_KEYS)
+                if np.isfinite(phase_diffs[:, col]).any()
+            }
+        return deviations
+
+    def compare(self, frame_metrics, phases=None, top_k=None):
+        """Match a shot against the library and report per-phase deviations from the best match
+
+        `phases` are the shot's segmented phases (see kinematics.segment_phases);
+        fixed fractions of the shot are used without them.
+        """
+        if not self.names:
+            return None
+
+        top_k = min(top_k or Config.REFERENCE_TOP_K, len(self.names))
+        raw_query = resample_series(metrics_to_array(frame_metrics), self.length)
+        query = raw_query / self.scale
+        if not np.isfinite(query).any():
+            return None
+
+        # Exact DTW only for references whose lower bound can still make the top k
+        bounds = self.lower_bounds(query)
+        order = np.argsort(bounds)
+        distances = np.full(len(self.names), np.inf)
+        kth_best = np.inf
+        searched = 0
+        for start in range(0, len(order), Config.DTW_BATCH_SIZE):
+            batch = order[start:start + Config.DTW_BATCH_SIZE]
+            batch = batch[bounds[batch] < kth_best]
+            if len(batch) == 0:
+                break
+            acc = self._dtw(query, self.normalized[batch])
+            distances[batch] = acc[:, -1, self.band]
+            searched += len(batch)
+            kth_best = np.partition(distances, top_k - 1)[top_k - 1]
+
+        ranked = np.argsort(distances)[:top_k]
+        best = ranked[0]
+        acc = self._dtw(query, self.normalized[best:best + 1])[0]
+        path = self._warping_path(acc)
+
+        return {
+            'best_match': self.names[best],
+            'distance': round(float(np.sqrt(distances[best] / self.length)), 3),
+            'matches': [
+                {'name': self.names[idx], 'distance': round(float(np.sqrt(distances[idx] / self.length)), 3)}
+                for idx in ranked
+            ],
+            'phase_deviations': self.phase_deviations(
+                raw_query, self.series[best], path, self.phase_fractions(len(frame_metrics), phases)
+            ),
+            'references_searched': searched,
+            'references_total': len(self.names)
+        }
+
+def main():
+    """Build a reference library: python -m utils.reference_comparison <json_or_video_dir> [output.npz]"""
+    if len(sys.argv) < 2:
+        print(main.__doc__)
+        return
+
+    output_path = sys.argv[2] if len(sys.argv) > 2 else Config.REFERENCE_LIBRARY_PATH
+    library = ReferenceLibrary.from_directory(sys.argv[1])
+    library.save(output_path)
+    print(f"📚 Saved {len(library)} reference shots to {output_path}")
+
+if __name__ == "__main__":
+    main()
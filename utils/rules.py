@@ -0,0 +1,280 @@
+# utils/rules.py - Declarative scoring rules compiled into vectorized predicates
+import json
+import os
+import sys
+import time
+import numpy as np
+from config.settings import Config
+from utils.biomechanics import FRAME_METRIC_KEYS, METRIC_KEYS
+from utils.kinematics import PHASES
+
+def merge_rules(base, override):
+    """Age-group overrides on top of a shot type's rules; dicts merge, anything else replaces"""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_rules(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def bounds(rule):
+    """Inclusive (low, high) of a band or check; a missing side is unbounded
+
+    `min`/`max` are inclusive, `above`/`below` exclusive; an exclusive bound
+    becomes the next float inside it, so every comparison stays inclusive.
+    """
+    if 'min' in rule and 'above' in rule or 'max' in rule and 'below' in rule:
+        raise ValueError(f"Use min or above, and max or below, not both: {rule}")
+    low, high = -np.inf, np.inf
+    if rule.get('min') is not None:
+        low = float(rule['min'])
+    elif rule.get('above') is not None:
+        low = np.nextafter(float(rule['above']), np.inf)
+    if rule.get('max') is not None:
+        high = float(rule['max'])
+    elif rule.get('below') is not None:
+        high = np.nextafter(float(rule['below']), -np.inf)
+    return low, high
+
+def as_score(value):
+    value = round(float(value), 1)
+    return int(value) if value.is_integer() else value
+
+class CompiledRules:
+    """The rules of one shot type and age group, with every threshold held in arrays
+
+    Predicates take arrays with any leading shape, so the same call scores one
+    session, a batch of stored sessions or the metrics of a live frame.
+    """
+
+    def __init__(self, shot_type, age_group, rules):
+        self.shot_type = shot_type
+        self.age_group = age_group
+        categories = rules['categories']
+        if not isinstance(categories, dict) or not categories:
+            raise ValueError("'categories' must be an object of named categories")
+        self.categories = list(categories)
+        for name, rule in categories.items():
+            if rule['metric'] not in METRIC_KEYS:
+                raise ValueError(f"Unknown metric '{rule['metric']}' in category '{name}'")
+            if name in METRIC_KEYS:
+                raise ValueError(f"Category '{name}' has the name of a metric")
+            unknown = [phase for phase in rule.get('phases') or [] if phase not in PHASES]
+            if unknown:
+                raise ValueError(f"Unknown phases {unknown} in category '{name}' (phases: {', '.join(PHASES)})")
+
+        # Aggregate name -> (metric, phases, start of the fallback window as a share of the clip)
+        self.aggregates = {
+            name: (rule['metric'], rule.get('phases'), rule.get('fallback_start', 0.0))
+            for name, rule in categories.items()
+        }
+
+        def column(key, default):
+            return np.array([float(rule.get(key, default)) for rule in categories.values()])
+
+        # Score bands, first match wins; padding bands (low > high) never match
+        n_bands = max([len(rule.get('bands', [])) for rule in categories.values()] + [1])
+        self.band_low = np.full((len(categories), n_bands), np.inf)
+        self.band_high = np.full((len(categories), n_bands), -np.inf)
+        self.band_score = np.zeros((len(categories), n_bands))
+        for c, rule in enumerate(categories.values()):
+            for b, band in enumerate(rule.get('bands', [])):
+                self.band_low[c, b], self.band_high[c, b] = bounds(band)
+                self.band_score[c, b] = band['score']
+        self.otherwise = column('otherwise', 5)
+
+        # Linear categories score value * scale, clipped to [min_score, max_score]
+        self.linear = np.array(['scale' in rule for rule in categories.values()])
+        self.scale = column('scale', 0)
+        self.min_score = column('min_score', 1)
+        self.max_score = column('max_score', 10)
+
+        self.good_score = column('good_score', 7)
+        self.feedback = [rule['feedback'] for rule in categories.values()]
+        for name, feedback in zip(self.categories, self.feedback):
+            # Checked here, so a bad edit is rejected on reload instead of failing every evaluation
+            if not (isinstance(feedback, list) and len(feedback) == 2 and all(isinstance(f, str) for f in feedback)):
+                raise ValueError(f"Category '{name}' needs feedback as [good, poor] strings")
+            for text in feedback:
+                try:
+                    text.format(value=0.0)
+                except (KeyError, IndexError, ValueError) as e:
+                    raise ValueError(f"Category '{name}' feedback {text!r} may only use {{value}}: {e!r}")
+        self.missing_score = np.array([float(rule['missing']['score']) for rule in categories.values()])
+        self.missing_feedback = [rule['missing']['feedback'] for rule in categories.values()]
+        min_frames = [rule.get('min_frames', {'frames': 0, 'score': 0, 'feedback': ''}) for rule in categories.values()]
+        self.min_frames = np.array([m['frames'] for m in min_frames])
+        self.few_frames_score = np.array([float(m['score']) for m in min_frames])
+        self.few_frames_feedback = [m['feedback'] for m in min_frames]
+
+        # Recommendations fire below or above a whole-clip aggregate of their metric
+        recommendations = rules.get('recommendations', [])
+        for rule in recommendations:
+            if rule['metric'] not in METRIC_KEYS:
+                raise ValueError(f"Unknown metric '{rule['metric']}' in a recommendation")
+            self.aggregates.setdefault(rule['metric'], (rule['metric'], None, 0.0))
+        self.recommendation_keys = [rule['metric'] for rule in recommendations]
+        self.recommendation_below = np.array([float(rule.get('below', -np.inf)) for rule in recommendations])
+        self.recommendation_above = np.array([float(rule.get('above', np.inf)) for rule in recommendations])
+        self.recommendation_text = [rule['text'] for rule in recommendations]
+        self.no_recommendations = rules.get('no_recommendations')
+
+        # Live overlay checks on each frame's metrics
+        live = rules.get('live_feedback', [])
+        for rule in live:
+            if rule['metric'] not in FRAME_METRIC_KEYS:
+                raise ValueError(f"Unknown metric '{rule['metric']}' in live feedback")
+        self.live_metrics = [rule['metric'] for rule in live]
+        live_bounds = np.array([bounds(rule) for rule in live]).reshape(-1, 2)
+        self.live_low, self.live_high = live_bounds[:, 0], live_bounds[:, 1]
+        self.live_text = [(rule['good'], rule['poor']) for rule in live]
+
+    def score(self, values, n_frames):
+        """Category scores for aggregate values shaped (..., categories); NaN is a missing value"""
+        values = np.asarray(values, dtype=float)
+        inside = (values[..., None] >= self.band_low) & (values[..., None] <= self.band_high)
+        first = inside.argmax(axis=-1)
+        banded = np.where(inside.any(axis=-1), self.band_score[np.arange(len(self.categories)), first], self.otherwise)
+        linear = np.clip(values * self.scale, self.min_score, self.max_score)
+
+        scores = np.where(self.linear, linear, banded)
+        scores = np.where(np.isnan(values), self.missing_score, scores)
+        return np.where(np.asarray(n_frames)[..., None] < self.min_frames, self.few_frames_score, scores)
+
+    def evaluate(self, averages, n_frames):
+        """Score and feedback per category for one session's aggregates"""
+        values = np.array([np.nan if averages[name] is None else averages[name] for name in self.categories])
+        scores = self.score(values, n_frames)
+
+        results = {}
+        for c, name in enumerate(self.categories):
+            if n_frames < self.min_frames[c]:
+                feedback = self.few_frames_feedback[c]
+            elif np.isnan(values[c]):
+                feedback = self.missing_feedback[c]
+            else:
+                good, poor = self.feedback[c]
+                feedback = (good if scores[c] >= self.good_score[c] else poor).format(value=values[c])
+            results[name] = {'score': as_score(scores[c]), 'feedback': feedback}
+        return results
+
+    def recommendations(self, averages):
+        values = np.array([np.nan if averages[key] is None else averages[key] for key in self.recommendation_keys])
+        fired = (values < self.recommendation_below) | (values > self.recommendation_above)
+        recommendations = [text for text, hit in zip(self.recommendation_text, fired) if hit]
+        if not recommendations and self.no_recommendations:
+            recommendations.append(self.no_recommendations)
+        return recommendations
+
+    def live_checks(self, values):
+        """(answered, good) for the live checks on metric values shaped (..., checks)"""
+        values = np.asarray(values, dtype=float)
+        return ~np.isnan(values), (values >= self.live_low) & (values <= self.live_high)
+
+    def live_feedback(self, metrics):
+        """(text, good) for each live check a frame's metrics can answer"""
+        values = [np.nan if metrics.get(key) is None else metrics[key] for key in self.live_metrics]
+        answered, good = self.live_checks(values)
+        return [
+            (texts[0] if ok else texts[1], bool(ok))
+            for texts, shown, ok in zip(self.live_text, answered, good) if shown
+        ]
+
+class RuleBook:
+    """The rules file, compiled for every shot type and age group and reloaded when it changes"""
+
+    def __init__(self, path=None):
+        self.path = path or Config.SCORING_RULES_PATH
+        self.checked_at = time.monotonic()
+        self.load()
+
+    def load(self):
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, encoding='utf-8') as f:
+            rules = json.load(f)
+
+        # Everything is compiled up front, so a bad edit is rejected as a whole
+        compiled = {}
+        for shot_type, shot_rules in rules.items():
+            base = {key: value for key, value in shot_rules.items() if key != 'age_groups'}
+            for age_group, override in (shot_rules.get('age_groups') or {Config.AGE_GROUP: {}}).items():
+                compiled[shot_type, age_group] = CompiledRules(shot_type, age_group, merge_rules(base, override))
+        self.compiled = compiled
+        self.mtime = mtime
+
+    def reload_if_changed(self):
+        """Reload at most every RULES_RELOAD_INTERVAL seconds; an invalid file keeps the old rules"""
+        now = time.monotonic()
+        if now - self.checked_at < Config.RULES_RELOAD_INTERVAL:
+            return
+        self.checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self.mtime:
+            return
+
+        try:
+            self.load()
+            print(f"🔄 Reloaded scoring rules from {self.path}")
+        except Exception as e:
+            # Any malformed file must leave the running rules in place; report it once, not on every check
+            self.mtime = mtime
+            print(f"⚠️ Keeping previous scoring rules, {self.path} is invalid: {e}")
+
+    def profiles(self):
+        return sorted(self.compiled)
+
+    def get(self, shot_type=None, age_group=None):
+        """Compiled rules for a shot type and age group (Config.SHOT_TYPE / AGE_GROUP by default)"""
+        self.reload_if_changed()
+        key = (shot_type or Config.SHOT_TYPE, age_group or Config.AGE_GROUP)
+        if key not in self.compiled:
+            available = ', '.join(f"{s}/{a}" for s, a in self.profiles())
+            raise ValueError(f"No scoring rules for {key[0]}/{key[1]} (available: {available})")
+        return self.compiled[key]
+
+_rulebooks = {}
+
+def load_rules(path=None):
+    """Shared RuleBook for a rules file, so it is parsed and compiled once per process"""
+    path = path or Config.SCORING_RULES_PATH
+    if path not in _rulebooks:
+        _rulebooks[path] = RuleBook(path)
+    return _rulebooks[path]
+
+def main():
+    """Re-score a saved session: python -m utils.rules <output_dir> [shot_type] [age_group]"""
+    if len(sys.argv) < 2:
+        print("Usage: python -m utils.rules <output_dir> [shot_type] [age_group]")
+        sys.exit(1)
+
+    from utils.evaluator import ShotEvaluator
+    path = sys.argv[1]
+    if os.path.isdir(path):
+        path = os.path.join(path, 'frame_metrics.json')
+    with open(path) as f:
+        frame_metrics = json.load(f)
+
+    try:
+        evaluator = ShotEvaluator(*sys.argv[2:4])
+    except ValueError as e:
+        print(f"❌ {e}")
+        print("Profiles: " + ', '.join(f"{shot_type} {age_group}" for shot_type, age_group in load_rules().profiles()))
+        sys.exit(1)
+    start_time = time.perf_counter()
+    evaluation = evaluator.evaluate_shot(frame_metrics)
+    elapsed = time.perf_counter() - start_time
+
+    rules = evaluation.get('rules', {})
+    print(f"✅ {len(frame_metrics)} frames re-scored as {rules.get('shot_type')}/{rules.get('age_group')} "
+          f"in {elapsed * 1000:.1f} ms: {evaluation['overall_score']}/10")
+    for category, data in evaluation['scores'].items():
+        print(f"  {category}: {data['score']}/10 - {data['feedback']}")
+    for recommendation in evaluation['recommendations']:
+        print(f"  • {recommendation}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,18 @@
 # utils/video_processor.py - COMPLETE FILE
-import cv2
 import numpy as np
 from utils.pose_detector import PoseDetector
+from utils.rules import load_rules
+from utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
 
 class VideoProcessor:
-    def __init__(self):
+    def __init__(self, shot_type=None, age_group=None):
         self.pose_detector = PoseDetector()
+        # Live feedback checks come from the scoring rules file
+        self.rulebook = load_rules()
+        self.shot_type = shot_type
+        self.age_group = age_group
         
     def add_overlays(self, frame, pose_results, metrics, frame_number):
         """Add all overlays to frame"""
@@ -55,6 +62,11 @@ class VideoProcessor:
         if metrics['balance_score'] is not None:
             cv2.putText(frame, f"Balance: {metrics['balance_score']:.2f}", 
                        (20, overlay_y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            overlay_y += 25
+        
+        if metrics.get('phase') is not None:
+            cv2.putText(frame, f"Phase: {metrics['phase'].replace('_', ' ').title()}", 
+                       (20, overlay_y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
         
         return frame
     
@@ -62,23 +74,13 @@ class VideoProcessor:
         """Add real-time feedback"""
         feedback_y = 250
         
-        if metrics['elbow_angle'] is not None:
-            if 110 <= metrics['elbow_angle'] <= 140:
-                cv2.putText(frame, "✅ Good elbow elevation", 
-                           (20, feedback_y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-            else:
-                cv2.putText(frame, "❌ Check elbow position", 
-                           (20, feedback_y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        rules = self.rulebook.get(self.shot_type, self.age_group)
+        for text, good in rules.live_feedback(metrics):
+            color = (0, 255, 0) if good else (0, 0, 255)
+            cv2.putText(frame, text, 
+                       (20, feedback_y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
             feedback_y += 30
         
-        if metrics['head_knee_alignment'] is not None:
-            if metrics['head_knee_alignment'] < 0.05:
-                cv2.putText(frame, "✅ Head over front knee", 
-                           (20, feedback_y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-            else:
-                cv2.putText(frame, "❌ Head not over front knee", 
-                           (20, feedback_y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-        
         return frame
     
     def add_frame_info(self, frame, frame_number):
@@ -89,6 +91,15 @@ class VideoProcessor:
                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
         return frame
     
+    def add_track_label(self, frame, track_id, box, primary=False):
+        """Label a tracked person with their ID"""
+        x0, y0, x1, y1 = (int(v) for v in box)
+        color = (0, 255, 255) if primary else (255, 255, 0)
+        cv2.rectangle(frame, (x0, y0), (x1, y1), color, 1)
+        cv2.putText(frame, f"ID {track_id}" + (" (batter)" if primary else ""), 
+                   (x0, max(15, y0 - 5)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+        return frame
+    
     def add_no_detection_overlay(self, frame):
         """Add overlay when no pose detected"""
         cv2.putText(frame, "No pose detected", 
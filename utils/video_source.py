@@ -0,0 +1,407 @@
+# utils/video_source.py - Streaming ingestion of remote videos
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import urllib.request
+from urllib.parse import urlparse
+import numpy as np
+from config.settings import Config
+from utils.decoders import DecodedVideo, output_size
+from utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+VIDEO_EXTENSIONS = ('.mp4', '.webm', '.mkv', '.mov', '.avi', '.flv')
+
+# yt_dlp options shared by full downloads and URL resolution
+YDL_OPTIONS = {
+    'format': 'best[height<=720]',
+
+    # Latest user agent and headers
+    'http_headers': {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
+    },
+
+    # Updated extractor args for 2025
+    'extractor_args': {
+        'youtube': {
+            'player_client': ['android', 'web', 'ios'],
+            'skip': ['dash', 'hls'],
+            'player_skip': ['configs'],
+        }
+    },
+
+    # Enhanced retry settings
+    'retries': 10,
+    'fragment_retries': 10,
+    'extract_flat': False,
+    'writesubtitles': False,
+    'writeautomaticsub': False,
+
+    # Additional fixes for 403 errors
+    'cookiefile': None,
+    'source_address': '0.0.0.0',
+}
+
+def resolve_media_url(url):
+    """Direct media URL, HTTP headers, extension and stream info for a video URL"""
+    path = urlparse(url).path.lower()
+    if path.endswith(VIDEO_EXTENSIONS):
+        return url, {}, os.path.splitext(path)[1], {}
+
+    # Page URLs (YouTube etc.) are resolved without downloading
+    import yt_dlp
+    with yt_dlp.YoutubeDL(dict(YDL_OPTIONS, quiet=True)) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    stream_info = {
+        'width': info.get('width'),
+        'height': info.get('height'),
+        'fps': info.get('fps')
+    }
+    return info['url'], info.get('http_headers', {}), '.' + info.get('ext', 'mp4'), stream_info
+
+class DownloadCache:
+    """Content-addressed store of downloaded videos with a URL index
+
+    Safe to share between processes (e.g. the HTTP service's workers): each
+    download goes to its own temp file, and the index is one file per URL,
+    replaced atomically, so there is no shared file to read-modify-write.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or Config.DOWNLOAD_CACHE_DIR
+        self.objects_dir = os.path.join(self.root, 'objects')
+        self.index_dir = os.path.join(self.root, 'index')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def index_path(self, url):
+        return os.path.join(self.index_dir, hashlib.sha256(url.encode()).hexdigest())
+
+    def lookup(self, url):
+        """Path of the cached video for a URL, or None"""
+        try:
+            with open(self.index_path(url)) as f:
+                name = f.read().strip()
+        except OSError:
+            return None
+        path = os.path.join(self.objects_dir, name)
+        try:
+            os.utime(path)  # Recently used, evicted last
+        except OSError:
+            return None
+        return path
+
+    def temp_path(self):
+        """A new, unique file for one download"""
+        fd, path = tempfile.mkstemp(dir=self.root, suffix='.part')
+        os.close(fd)
+        return path
+
+    def store(self, url, temp_path, digest, ext):
+        """Move a finished download into the store under its content hash"""
+        name = digest + ext
+        path = os.path.join(self.objects_dir, name)
+        # Same name, same content: whichever process replaces last wins harmlessly
+        os.replace(temp_path, path)
+
+        fd, tmp_index = tempfile.mkstemp(dir=self.index_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(name)
+        os.replace(tmp_index, self.index_path(url))
+
+        self.evict(keep=name)
+        return path
+
+    def evict(self, keep=None):
+        """Delete least recently used videos beyond the size limit"""
+        entries = []
+        for name in os.listdir(self.objects_dir):
+            try:
+                stat = os.stat(os.path.join(self.objects_dir, name))
+            except FileNotFoundError:  # Evicted by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = set()
+        for _, size, name in sorted(entries):
+            if total <= Config.DOWNLOAD_CACHE_MAX_BYTES:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.objects_dir, name))
+            except FileNotFoundError:
+                pass
+            evicted.add(name)
+            total -= size
+
+        # Index entries of evicted videos; lookup() also ignores any that are missed here
+        if evicted:
+            for entry in os.listdir(self.index_dir):
+                path = os.path.join(self.index_dir, entry)
+                try:
+                    with open(path) as f:
+                        if f.read().strip() in evicted:
+                            os.remove(path)
+                except OSError:
+                    pass
+
+def probe_stream(data):
+    """Upright width and height, fps and frame count from the first bytes of a video, or None"""
+    if shutil.which('ffprobe') is None:
+        return None
+
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height,avg_frame_rate,nb_frames:stream_tags=rotate:stream_side_data=rotation',
+        '-of', 'json', '-i', 'pipe:0'
+    ]
+    try:
+        result = subprocess.run(cmd, input=data, capture_output=True, timeout=Config.STREAM_TIMEOUT)
+        stream = json.loads(result.stdout)['streams'][0]
+        numerator, denominator = stream.get('avg_frame_rate', '0/1').split('/')
+
+        # Phone videos are stored sideways with a rotation tag (older files) or
+        # display-matrix side data; ffmpeg rotates them upright when decoding
+        rotation = stream.get('tags', {}).get('rotate', 0)
+        for side_data in stream.get('side_data_list', []):
+            rotation = side_data.get('rotation', rotation)
+        width, height = int(stream['width']), int(stream['height'])
+        if round(float(rotation)) % 180 == 90:
+            width, height = height, width
+
+        return {
+            'width': width,
+            'height': height,
+            'fps': float(numerator) / float(denominator) if float(denominator) else 0.0,
+            'frame_count': int(stream.get('nb_frames', 0) or 0)
+        }
+    except Exception:
+        # The moov atom may sit at the end of the file; the caller waits for the full download
+        return None
+
+class StreamingVideoCapture:
+    """cv2.VideoCapture-like reader that decodes a remote video while it downloads
+
+    The download is written to a growing file in the cache directory; a feeder
+    thread tails that file into an ffmpeg pipe, so frames become available
+    before the download finishes. Repeated URLs are read from the cache.
+    """
+
+    def __init__(self, url, cache=None):
+        self.url = url
+        self.cache = cache or DownloadCache()
+        self.capture = None
+        self.decoder = None
+        self.feeder = None
+        self.stream_info = {}
+        self.path = None
+        self.error = None
+
+        self.progress = threading.Condition()
+        self.downloaded = 0
+        self.complete = False
+        self.finished = False
+        self.decoder_chosen = threading.Event()
+
+        cached = self.cache.lookup(url)
+        if cached:
+            print("📦 Using cached download")
+            self.path = cached
+            self._open_capture()
+            return
+
+        try:
+            media_url, headers, ext, self.stream_info = resolve_media_url(url)
+        except Exception as e:
+            print(f"Error resolving video URL: {e}")
+            return
+
+        self.part_path = self.cache.temp_path()
+        self.downloader = threading.Thread(
+            target=self._download, args=(media_url, headers, ext), daemon=True
+        )
+        self.downloader.start()
+        self._open_decoder()
+
+    def _download(self, media_url, headers, ext):
+        digest = hashlib.sha256()
+        try:
+            request = urllib.request.Request(media_url, headers=headers)
+            with urllib.request.urlopen(request, timeout=Config.STREAM_TIMEOUT) as response, \
+                    open(self.part_path, 'wb') as f:
+                while True:
+                    chunk = response.read(Config.STREAM_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    f.flush()
+                    digest.update(chunk)
+                    with self.progress:
+                        self.downloaded += len(chunk)
+                        self.progress.notify_all()
+
+                # read() returns b'' on a dropped connection instead of raising
+                expected = response.headers.get('Content-Length')
+                if expected is not None and self.downloaded < int(expected):
+                    raise IOError(f"Download ended after {self.downloaded} of {expected} bytes")
+        except Exception as e:
+            # Set before `complete`, so it is visible once the decoder runs dry
+            print(f"Error downloading video: {e}")
+            self.error = e
+
+        try:
+            with self.progress:
+                self.complete = True
+                self.progress.notify_all()
+
+            # The feeder may still be reading the partial file
+            self.decoder_chosen.wait()
+            if self.feeder is not None:
+                self.feeder.join()
+            if self.error is None:
+                self.path = self.cache.store(self.url, self.part_path, digest.hexdigest(), ext)
+            elif os.path.exists(self.part_path):
+                os.remove(self.part_path)
+        except Exception as e:
+            print(f"Error caching video: {e}")
+        finally:
+            with self.progress:
+                self.finished = True
+                self.progress.notify_all()
+
+    def _open_decoder(self):
+        """Start decoding from the growing file, or fall back to the finished download"""
+        try:
+            info = self._start_decoder()
+        finally:
+            self.decoder_chosen.set()
+
+        if info is None:
+            with self.progress:
+                while not self.finished:
+                    self.progress.wait()
+            if self.path:
+                self._open_capture()
+
+    def _open_capture(self):
+        """Decode a finished file like any local video (threaded, scaled, with RGB frames)"""
+        try:
+            self.capture = DecodedVideo(self.path)
+        except IOError as e:
+            print(f"Error opening video: {e}")
+
+    def _start_decoder(self):
+        """Probe the first downloaded bytes and start the ffmpeg pipe; returns the stream info"""
+        with self.progress:
+            while self.downloaded < Config.STREAM_PROBE_BYTES and not self.complete:
+                self.progress.wait()
+
+        info = None
+        if shutil.which('ffmpeg') is not None and self.error is None:
+            with open(self.part_path, 'rb') as f:
+                info = probe_stream(f.read(Config.STREAM_PROBE_BYTES))
+
+        if info is None:
+            return None
+
+        # Scaled to MAX_RESOLUTION like local files
+        info['width'], info['height'] = output_size(info['width'], info['height'])
+        self.stream_info = dict(self.stream_info, **{k: v for k, v in info.items() if v})
+        self.frame_bytes = info['width'] * info['height'] * 3
+        # The output size is forced, so frames always match frame_bytes (and are scaled)
+        size = f"{info['width']}x{info['height']}"
+        self.decoder = subprocess.Popen(
+            ['ffmpeg', '-v', 'error', '-i', 'pipe:0', '-s', size, '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        self.feeder = threading.Thread(target=self._feed, daemon=True)
+        self.feeder.start()
+        return info
+
+    def _feed(self):
+        """Tail the growing download into the decoder's stdin"""
+        try:
+            with open(self.part_path, 'rb') as f:
+                while True:
+                    # Checked before reading: an empty read after `complete` is the real end,
+                    # while one before it may have raced the last chunk
+                    with self.progress:
+                        complete = self.complete
+                    chunk = f.read(Config.STREAM_CHUNK_BYTES)
+                    if chunk:
+                        self.decoder.stdin.write(chunk)
+                        continue
+                    if complete:
+                        break
+                    with self.progress:
+                        if not self.complete:
+                            self.progress.wait(0.5)
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+        finally:
+            try:
+                self.decoder.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+    def __repr__(self):
+        return f"StreamingVideoCapture({self.url!r})"
+
+    def isOpened(self):
+        if self.capture is not None:
+            return self.capture.isOpened()
+        return self.decoder is not None
+
+    def read_pair(self):
+        """(ret, bgr_frame, rgb_frame); rgb_frame is None from the ffmpeg pipe"""
+        if self.capture is not None:
+            return self.capture.read_pair()
+        return self.read() + (None,)
+
+    def read(self):
+        if self.capture is not None:
+            return self.capture.read()
+        if self.decoder is None:
+            return False, None
+
+        data = self.decoder.stdout.read(self.frame_bytes)
+        if len(data) < self.frame_bytes:
+            return False, None
+        frame = np.frombuffer(data, np.uint8).reshape(
+            self.stream_info['height'], self.stream_info['width'], 3
+        )
+        return True, frame.copy()
+
+    def set(self, prop, value):
+        """Seeks a cached download; the ffmpeg pipe cannot seek"""
+        if self.capture is not None:
+            return self.capture.set(prop, value)
+        return False
+
+    def get(self, prop):
+        if self.capture is not None:
+            return self.capture.get(prop)
+
+        values = {
+            cv2.CAP_PROP_FPS: self.stream_info.get('fps') or 0.0,
+            cv2.CAP_PROP_FRAME_WIDTH: self.stream_info.get('width') or 0,
+            cv2.CAP_PROP_FRAME_HEIGHT: self.stream_info.get('height') or 0,
+            cv2.CAP_PROP_FRAME_COUNT: self.stream_info.get('frame_count') or 0
+        }
+        return float(values.get(prop, 0.0))
+
+    def release(self):
+        if self.capture is not None:
+            self.capture.release()
+        if self.decoder is not None:
+            self.decoder.kill()
+            self.decoder.wait()
+            self.decoder = None